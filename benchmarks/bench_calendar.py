@@ -0,0 +1,61 @@
+"""
+31-day calendar view: 31 per-day DATE() queries (the old /api/calendar/day
+pattern) against one scheduled_at range query (/api/calendar/range).
+Runs against the database configured in .env.
+
+    python -m benchmarks.bench_calendar [user_id] [first_day] [repeats]
+"""
+import sys
+import time
+import datetime
+from src.db import get_db
+from src.api.medications import fetch_calendar
+
+PER_DAY_SQL = """
+    SELECT di.instance_id, di.scheduled_at, di.status,
+           m.name
+    FROM dose_instances di
+    JOIN medications m ON m.med_id = di.med_id
+    WHERE m.user_id = %s
+      AND DATE(di.scheduled_at) = %s
+    ORDER BY di.scheduled_at ASC
+"""
+
+
+def per_day(cur, user_id, first_day):
+    rows = 0
+    for i in range(31):
+        cur.execute(PER_DAY_SQL, (user_id, first_day + datetime.timedelta(days=i)))
+        rows += len(cur.fetchall())
+    return rows
+
+
+def ranged(cur, user_id, first_day):
+    days = fetch_calendar(cur, user_id, first_day, first_day + datetime.timedelta(days=31))
+    return sum(len(doses) for doses in days.values())
+
+
+def main():
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    first_day = (datetime.date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2
+                 else datetime.date.today().replace(day=1))
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+
+    for label, fn in (("31 x DATE() = day", per_day), ("1 x scheduled_at range", ranged)):
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            rows = fn(cur, user_id, first_day)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        print(f"{label:<24} rows={rows:<6} median={samples[len(samples) // 2]:.2f} ms  max={samples[-1]:.2f} ms")
+
+    cur.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
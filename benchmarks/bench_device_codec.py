@@ -0,0 +1,80 @@
+"""
+Bytes on the wire and server encode time for device responses:
+JSON vs CBOR vs the fixed STATE struct (src/device_codec.py).
+No database needed.
+
+    python -m benchmarks.bench_device_codec [iterations]
+"""
+import sys
+import json
+import time
+from src.device_codec import cbor_dumps, cbor_loads, state_dumps, state_loads
+
+PAYLOADS = {
+    "poll": {"led": True, "sound": True, "vibration": False, "alert": True},
+    "wait": {"version": 1842, "led": True, "sound": True, "vibration": False, "alert": True},
+    "alert_status": {
+        "should_alert": True, "instance_id": 48213, "scheduled_at": "2025-11-07T08:00:00",
+        "led": True, "sound": True, "vibration": True,
+    },
+    "sync": {
+        "versions": {"device": 1842, "data": 77},
+        "events": {"accepted": 3},
+        "acks": [{"instance_id": 48213, "result": "applied"}],
+        "alert": {"active": False, "should_alert": False, "instance_id": 48214,
+                  "scheduled_at": "2025-11-07T12:00:00"},
+        "paired": True,
+        "settings": {"sound": True, "vibration": False, "led": True},
+        "doses": [
+            {"instance_id": 48214 + i, "med_id": 12 + i % 3, "name": "Metformin 500mg",
+             "scheduled_at": f"2025-11-07T{12 + i:02d}:00:00", "slot": 1 + i % 3}
+            for i in range(8)
+        ],
+    },
+}
+
+
+def per_call_us(fn, iterations):
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print(f"{'payload':<14} {'format':<7} {'bytes':>6} {'encode us':>10} {'hook us':>9} {'decode us':>10}")
+    for name, payload in PAYLOADS.items():
+        text = json.dumps(payload, separators=(",", ":")).encode()
+        cbor = cbor_dumps(payload)
+        state = state_dumps(payload)
+
+        rows = [
+            ("json", len(text),
+             per_call_us(lambda: json.dumps(payload, separators=(",", ":")).encode(), iterations),
+             None,
+             per_call_us(lambda: json.loads(text), iterations)),
+            # "hook" is what the after_request hook does: parse the jsonify output, re-encode
+            ("cbor", len(cbor),
+             per_call_us(lambda: cbor_dumps(payload), iterations),
+             per_call_us(lambda: cbor_dumps(json.loads(text)), iterations),
+             per_call_us(lambda: cbor_loads(cbor), iterations)),
+        ]
+        if state is not None:
+            rows.append(("state", len(state),
+                         per_call_us(lambda: state_dumps(payload), iterations),
+                         per_call_us(lambda: state_dumps(json.loads(text)), iterations),
+                         per_call_us(lambda: state_loads(state), iterations)))
+
+        for fmt, size, encode, hook, decode in rows:
+            hook = f"{hook:.2f}" if hook is not None else "-"
+            print(f"{name:<14} {fmt:<7} {size:>6} {encode:>10.2f} {hook:>9} {decode:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
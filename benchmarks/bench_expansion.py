@@ -0,0 +1,66 @@
+"""
+Micro-benchmarks for src.scheduler.expansion. No database needed.
+
+    python -m benchmarks.bench_expansion [medications]
+"""
+import sys
+import time
+import random
+import datetime
+from src.scheduler.expansion import CompiledSchedule, expand_many, horizon
+
+
+def make_schedules(count, seed=7):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    schedules = []
+
+    for med_id in range(1, count + 1):
+        times = sorted({f"{rng.randrange(5, 23):02d}:{rng.choice((0, 15, 30, 45)):02d}"
+                        for _ in range(rng.randint(1, 4))})
+        kind = rng.choice(("daily", "daily", "weekly", "custom", "once"))
+        mask = "".join(rng.choice("01") for _ in range(7)) if kind == "weekly" else "1111111"
+        start = (today + datetime.timedelta(days=rng.randrange(0, 10))).isoformat()
+        end = (today + datetime.timedelta(days=rng.randrange(10, 60))).isoformat()
+        schedules.append((med_id, kind, times, mask, start, end))
+
+    return schedules
+
+
+def bench(label, fn, repeats=5):
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<38} {best * 1000:>9.2f} ms   {result}")
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    raw = make_schedules(count)
+
+    compiled = []
+
+    def compile_all():
+        compiled[:] = [(med_id, CompiledSchedule(kind, times, mask, start, end))
+                       for med_id, kind, times, mask, start, end in raw]
+        return f"{len(compiled)} schedules"
+
+    bench(f"compile {count} schedules", compile_all)
+
+    for days in (1, 7, 30, 90):
+        start, end = horizon(days=days)
+        bench(f"expand {days:>2} days",
+              lambda: f"{sum(1 for _ in expand_many(compiled, start, end))} doses")
+
+    start, end = horizon(days=30)
+    bench("expand 30 days, first 1000 doses only",
+          lambda: f"{sum(1 for _, _ in zip(range(1000), expand_many(compiled, start, end)))} doses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Request latency of POST /api/medications (30 days of doses) against the
+number of times per day. Runs against the database configured in .env
+and cleans up the medications it creates.
+
+    python -m benchmarks.bench_medication_write [user_id] [repeats]
+"""
+import os
+import sys
+import time
+import datetime
+import jwt
+from src import create_app
+
+JWT_SECRET = os.getenv("JWT_SECRET", "super_secret_key123")
+
+
+def main():
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    token = jwt.encode(
+        {"user_id": user_id, "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+        JWT_SECRET,
+        algorithm="HS256"
+    )
+    headers = {"Authorization": "Bearer " + token}
+    client = create_app().test_client()
+
+    print(f"{'times/day':>9} {'doses':>6} {'median ms':>10} {'max ms':>8}")
+    for per_day in (1, 2, 4, 6, 8, 12):
+        times = [f"{6 + i:02d}:{(i * 7) % 60:02d}" for i in range(per_day)]
+        samples = []
+
+        for _ in range(repeats):
+            start = time.perf_counter()
+            resp = client.post("/api/medications", headers=headers, json={
+                "name": "bench",
+                "notes": None,
+                "schedule": {"repeat_type": "daily", "times": times},
+            })
+            samples.append((time.perf_counter() - start) * 1000)
+            client.delete(f"/api/medications/{resp.json['med_id']}", headers=headers)
+
+        samples.sort()
+        print(f"{per_day:>9} {per_day * 30:>6} {samples[len(samples) // 2]:>10.1f} {samples[-1]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+/* Indexes for the scheduler's due-dose lookup.
+   check_medications filters dose_instances by status and a scheduled_at
+   range, then joins active pairings by user. */
+
+USE pillpal_db;
+
+ALTER TABLE dose_instances
+  ADD INDEX idx_dose_status_time (status, scheduled_at);
+
+ALTER TABLE device_pairings
+  ADD INDEX idx_pairings_user_active (user_id, active);
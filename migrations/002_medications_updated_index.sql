@@ -0,0 +1,7 @@
+/* The scheduler's dose queue polls medications.updated_at as a
+   high-water mark to pick up schedule edits from other processes. */
+
+USE pillpal_db;
+
+ALTER TABLE medications
+  ADD INDEX idx_medications_updated (updated_at);
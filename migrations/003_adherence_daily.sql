@@ -0,0 +1,19 @@
+/* Daily per-user, per-medication adherence counters.
+   Populate once after creating the table:
+     python -m src.adherence rebuild */
+
+USE pillpal_db;
+
+CREATE TABLE adherence_daily (
+  user_id INT NOT NULL,
+  med_id INT NOT NULL,
+  day DATE NOT NULL,
+  scheduled INT NOT NULL DEFAULT 0,
+  taken INT NOT NULL DEFAULT 0,
+  missed INT NOT NULL DEFAULT 0,
+  snoozed INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, day, med_id),
+  INDEX idx_adherence_med (med_id),
+  FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+  FOREIGN KEY (med_id) REFERENCES medications(med_id) ON DELETE CASCADE
+);
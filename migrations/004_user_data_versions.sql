@@ -0,0 +1,10 @@
+/* Per-user data version behind the ETag / If-None-Match support on
+   medication and calendar reads. */
+
+USE pillpal_db;
+
+CREATE TABLE user_data_versions (
+  user_id INT PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
@@ -0,0 +1,18 @@
+/* Progress of chunked background deletes (medications, accounts).
+   No foreign key to users: account jobs outlive the user row. */
+
+USE pillpal_db;
+
+CREATE TABLE deletion_jobs (
+  job_id INT AUTO_INCREMENT PRIMARY KEY,
+  kind ENUM('medication','account') NOT NULL,
+  user_id INT NOT NULL,
+  target_id INT,
+  status ENUM('pending','running','done','failed') NOT NULL DEFAULT 'pending',
+  rows_deleted INT NOT NULL DEFAULT 0,
+  current_table VARCHAR(64),
+  error VARCHAR(255),
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  INDEX idx_deletion_jobs_status (status, updated_at)
+);
@@ -0,0 +1,8 @@
+/* device_pairings.updated_at lets the in-memory pairing resolver
+   (src/pairings.py) detect changes with one aggregate query. */
+
+USE pillpal_db;
+
+ALTER TABLE device_pairings
+  ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  ADD INDEX idx_pairings_updated (updated_at);
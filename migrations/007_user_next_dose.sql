@@ -0,0 +1,13 @@
+/* Maintained next due dose per user, so /api/device/alert_status is a
+   primary-key lookup. Rows are created on demand; no backfill needed. */
+
+USE pillpal_db;
+
+CREATE TABLE user_next_dose (
+  user_id INT PRIMARY KEY,
+  instance_id INT,
+  med_id INT,
+  scheduled_at DATETIME,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
@@ -0,0 +1,13 @@
+/* /api/device/event has always written to device_events, but the table
+   was never part of the schema. Skip this file if it already exists. */
+
+USE pillpal_db;
+
+CREATE TABLE IF NOT EXISTS device_events (
+  event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  device_id INT NOT NULL,
+  event_type VARCHAR(64) NOT NULL,
+  source VARCHAR(32) NOT NULL DEFAULT 'device',
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_device_events_device_time (device_id, created_at)
+);
@@ -0,0 +1,12 @@
+/* Idempotency keys of device messages applied by the MQTT ingest worker
+   (device sequence number, or event + device timestamp), so a message
+   redelivered by the broker is not applied twice. */
+
+USE pillpal_db;
+
+CREATE TABLE device_messages (
+  device_id INT NOT NULL,
+  msg_key VARCHAR(64) NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (device_id, msg_key)
+);
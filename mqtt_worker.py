@@ -0,0 +1,15 @@
+import sys
+from dotenv import load_dotenv
+
+
+ENV_PATH = "/var/www/pillpal/PILLPAL-Backend/.env"
+load_dotenv(ENV_PATH)
+
+sys.path.insert(0, "/var/www/pillpal/PILLPAL-Backend")
+
+# Runs outside mod_wsgi as its own long-lived process, e.g.
+#   venv/bin/python mqtt_worker.py
+from src.mqtt.ingest import main
+
+if __name__ == "__main__":
+    main()
@@ -41,6 +41,9 @@ CREATE TABLE device_pairings (
   active BOOLEAN DEFAULT TRUE,
   paired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   unpaired_at TIMESTAMP NULL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  INDEX idx_pairings_user_active (user_id, active),
+  INDEX idx_pairings_updated (updated_at),
   FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
   FOREIGN KEY (device_id) REFERENCES devices(device_id) ON DELETE CASCADE
 );
@@ -65,6 +68,7 @@ CREATE TABLE medications (
   end_date DATE,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  INDEX idx_medications_updated (updated_at),
   FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
@@ -106,6 +110,7 @@ CREATE TABLE dose_instances (
   status ENUM('scheduled','taken','snoozed','missed','cancelled') NOT NULL DEFAULT 'scheduled',
   created_source ENUM('app','device') NOT NULL DEFAULT 'app',
   UNIQUE (med_id, scheduled_at),
+  INDEX idx_dose_status_time (status, scheduled_at),
   FOREIGN KEY (med_id) REFERENCES medications(med_id) ON DELETE CASCADE
 );
 
@@ -119,6 +124,71 @@ CREATE TABLE dose_events (
   FOREIGN KEY (instance_id) REFERENCES dose_instances(instance_id) ON DELETE CASCADE
 );
 
+/* Raw events reported by devices (/api/device/event), written in batches */
+CREATE TABLE device_events (
+  event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  device_id INT NOT NULL,
+  event_type VARCHAR(64) NOT NULL,
+  source VARCHAR(32) NOT NULL DEFAULT 'device',
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_device_events_device_time (device_id, created_at)
+);
+
+/* Keys of device messages applied by the MQTT ingest worker (dedup) */
+CREATE TABLE device_messages (
+  device_id INT NOT NULL,
+  msg_key VARCHAR(64) NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (device_id, msg_key)
+);
+
+/* ADHERENCE ROLLUP (maintained by src/adherence.py) */
+CREATE TABLE adherence_daily (
+  user_id INT NOT NULL,
+  med_id INT NOT NULL,
+  day DATE NOT NULL,
+  scheduled INT NOT NULL DEFAULT 0,
+  taken INT NOT NULL DEFAULT 0,
+  missed INT NOT NULL DEFAULT 0,
+  snoozed INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, day, med_id),
+  INDEX idx_adherence_med (med_id),
+  FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+  FOREIGN KEY (med_id) REFERENCES medications(med_id) ON DELETE CASCADE
+);
+
+/* Earliest pending dose per user; read by /api/device/alert_status (src/next_dose.py) */
+CREATE TABLE user_next_dose (
+  user_id INT PRIMARY KEY,
+  instance_id INT,
+  med_id INT,
+  scheduled_at DATETIME,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+/* Bumped on every medication/dose write; GET handlers derive ETags from it */
+CREATE TABLE user_data_versions (
+  user_id INT PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+/* Chunked background deletes (src/deletion.py) */
+CREATE TABLE deletion_jobs (
+  job_id INT AUTO_INCREMENT PRIMARY KEY,
+  kind ENUM('medication','account') NOT NULL,
+  user_id INT NOT NULL,
+  target_id INT,
+  status ENUM('pending','running','done','failed') NOT NULL DEFAULT 'pending',
+  rows_deleted INT NOT NULL DEFAULT 0,
+  current_table VARCHAR(64),
+  error VARCHAR(255),
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  INDEX idx_deletion_jobs_status (status, updated_at)
+);
+
 /* SETTINGS & STATE */
 CREATE TABLE notification_settings (
   setting_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -193,6 +263,11 @@ VALUES
   (1, 'ack_taken', 'device', '{"note":"auto confirm yesterday AM"}'),
   (3, 'ack_taken', 'device', '{"note":"confirm today AM"}');
 
+INSERT INTO adherence_daily (user_id, med_id, day, scheduled, taken, missed, snoozed)
+VALUES
+  (1, 1, '2025-10-25', 2, 1, 1, 0),
+  (1, 1, '2025-10-26', 2, 1, 0, 0);
+
 INSERT INTO notification_settings (user_id)
 VALUES (1), (2);
 
@@ -1,25 +1,58 @@
 from flask import Flask
-from .db import get_db
+from .db import get_db, pool_stats, init_app as init_db
+from .query_stats import route_stats, init_app as init_query_stats
+from .device_codec import init_app as init_device_codec
 from .api.device_events import device_events_bp
+from .event_buffer import device_event_buffer
+from .mqtt.publisher import publisher as mqtt_publisher
 from .api.auth import auth_bp
-from .api.medications import med_bp
+from .api.medications import med_bp, med_cache
 from .api.settings import settings_bp
 from .api.device_poll import device_poll_bp
+from .api.device_ack import ack_bp
+from .api.device_sync import device_sync_bp
+from .api.adherence import adherence_bp
+from .api.jobs import jobs_bp
 from src.api.alarm import alarm_bp
 from src.scheduler.medication_scheduler import start_scheduler
+from src.scheduler.leader import leader_info
+from src.scheduler.device_hub import device_hub
+from src.pairings import pairing_resolver
 from src.api.device_alert import device_alert_bp
 
 
 def create_app():
     app = Flask(__name__)
+    init_db(app)
+    init_query_stats(app)
+    init_device_codec(app)
+
+    try:
+        pairing_resolver.warm()
+    except Exception as e:
+        # the resolver retries on first lookup
+        print("Pairing warm-up failed:", e)
 
     @app.route("/health")
     def health():
         try:
-            get_db()
-            return {"db": True, "status": "ok"}
+            if get_db() is None:
+                raise RuntimeError("no connection")
+            return {"db": True, "status": "ok", "pool": pool_stats(), "scheduler": leader_info()}
         except:
-            return {"db": False, "status": "db_error"}
+            return {"db": False, "status": "db_error", "pool": pool_stats(), "scheduler": leader_info()}
+
+    @app.route("/health/db")
+    def health_db():
+        return {
+            "pool": pool_stats(),
+            "routes": route_stats(),
+            "caches": {"medications": med_cache.stats()},
+            "device_wait": device_hub.stats(),
+            "pairings": pairing_resolver.stats(),
+            "device_events": device_event_buffer.stats(),
+            "mqtt_publisher": mqtt_publisher.stats()
+        }
 
     # Registering blueprints
     app.register_blueprint(device_events_bp)
@@ -27,6 +60,10 @@ def create_app():
     app.register_blueprint(med_bp)
     app.register_blueprint(settings_bp)
     app.register_blueprint(device_poll_bp)
+    app.register_blueprint(ack_bp)
+    app.register_blueprint(device_sync_bp)
+    app.register_blueprint(adherence_bp)
+    app.register_blueprint(jobs_bp)
     app.register_blueprint(alarm_bp)
     start_scheduler()
     app.register_blueprint(device_alert_bp, url_prefix="/api")
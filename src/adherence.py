@@ -0,0 +1,177 @@
+"""
+Daily adherence rollup (adherence_daily): one row per user, medication
+and day with the number of doses scheduled and how many are currently
+taken / missed / snoozed.
+
+The counters are maintained incrementally by the code paths that
+create, delete or change the status of dose_instances, inside the same
+transaction. rebuild() recomputes them from dose_instances:
+
+    python -m src.adherence rebuild [--user USER_ID]
+"""
+import sys
+import argparse
+from collections import defaultdict
+from src.db import get_db, insert_many
+
+STATUS_COLUMNS = {"taken": "taken", "missed": "missed", "snoozed": "snoozed"}
+
+
+def _in_clause(values):
+    return "(" + ", ".join(["%s"] * len(values)) + ")"
+
+
+def apply_deltas(cur, deltas):
+    """
+    deltas: {(user_id, med_id, day): {"scheduled": n, "taken": n, ...}}
+    Applied as one multi-row upsert.
+    """
+    rows = []
+    for (user_id, med_id, day), delta in deltas.items():
+        row = (user_id, med_id, day,
+               delta.get("scheduled", 0), delta.get("taken", 0),
+               delta.get("missed", 0), delta.get("snoozed", 0))
+        if any(row[3:]):
+            rows.append(row)
+
+    return insert_many(
+        cur,
+        "INSERT INTO adherence_daily (user_id, med_id, day, scheduled, taken, missed, snoozed)",
+        rows,
+        """ON DUPLICATE KEY UPDATE
+               scheduled = scheduled + VALUES(scheduled),
+               taken = taken + VALUES(taken),
+               missed = missed + VALUES(missed),
+               snoozed = snoozed + VALUES(snoozed)"""
+    )
+
+
+def _new_deltas():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def lock_doses(cur, instance_ids, user_id=None):
+    """
+    Locks the given dose rows and returns
+    {instance_id: (user_id, med_id, day, status)}.
+    With user_id, doses belonging to other users are left out.
+    """
+    instance_ids = list(instance_ids)
+    if not instance_ids:
+        return {}
+
+    sql = """
+        SELECT di.instance_id, m.user_id, di.med_id, DATE(di.scheduled_at), di.status
+        FROM dose_instances di
+        JOIN medications m ON m.med_id = di.med_id
+        WHERE di.instance_id IN """ + _in_clause(instance_ids)
+    params = list(instance_ids)
+    if user_id is not None:
+        sql += " AND m.user_id = %s"
+        params.append(user_id)
+
+    cur.execute(sql + " FOR UPDATE", tuple(params))
+    return {row[0]: tuple(row[1:]) for row in cur.fetchall()}
+
+
+def set_dose_status(cur, instance_ids, status, doses=None):
+    """
+    Sets dose_instances.status and moves the rollup counters from each
+    dose's old status to the new one. Returns the locked dose info
+    ({instance_id: (user_id, med_id, day, old_status)}) so callers can
+    see which users were affected.
+    """
+    if doses is None:
+        doses = lock_doses(cur, instance_ids)
+    if not doses:
+        return doses
+
+    cur.execute(
+        "UPDATE dose_instances SET status = %s WHERE instance_id IN " + _in_clause(doses),
+        (status, *doses)
+    )
+
+    deltas = _new_deltas()
+    new_column = STATUS_COLUMNS.get(status)
+    for user_id, med_id, day, old_status in doses.values():
+        old_column = STATUS_COLUMNS.get(old_status)
+        if old_column == new_column:
+            continue
+        key = (user_id, med_id, day)
+        if old_column:
+            deltas[key][old_column] -= 1
+        if new_column:
+            deltas[key][new_column] += 1
+
+    apply_deltas(cur, deltas)
+    return doses
+
+
+def record_scheduled(cur, user_id, doses):
+    """Counts newly inserted doses: doses is an iterable of (med_id, scheduled_at)."""
+    deltas = _new_deltas()
+    for med_id, scheduled_at in doses:
+        deltas[(user_id, med_id, scheduled_at.date())]["scheduled"] += 1
+    apply_deltas(cur, deltas)
+
+
+def record_removed(cur, user_id, doses):
+    """Uncounts deleted doses: doses is an iterable of (med_id, scheduled_at, status)."""
+    deltas = _new_deltas()
+    for med_id, scheduled_at, status in doses:
+        key = (user_id, med_id, scheduled_at.date())
+        deltas[key]["scheduled"] -= 1
+        column = STATUS_COLUMNS.get(status)
+        if column:
+            deltas[key][column] -= 1
+    apply_deltas(cur, deltas)
+
+
+def rebuild(cur, user_id=None):
+    """Recomputes the rollup from dose_instances for one user or everyone."""
+    where = ""
+    params = ()
+    if user_id is not None:
+        where = "WHERE m.user_id = %s"
+        params = (user_id,)
+
+    cur.execute("DELETE FROM adherence_daily" + (" WHERE user_id = %s" if params else ""), params)
+    cur.execute("""
+        INSERT INTO adherence_daily (user_id, med_id, day, scheduled, taken, missed, snoozed)
+        SELECT m.user_id, di.med_id, DATE(di.scheduled_at),
+               COUNT(*),
+               SUM(di.status = 'taken'),
+               SUM(di.status = 'missed'),
+               SUM(di.status = 'snoozed')
+        FROM dose_instances di
+        JOIN medications m ON m.med_id = di.med_id
+        """ + where + """
+        GROUP BY m.user_id, di.med_id, DATE(di.scheduled_at)
+    """, params)
+    return cur.rowcount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.adherence")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="recompute adherence_daily from dose_instances")
+    rebuild_cmd.add_argument("--user", type=int, help="only this user_id")
+    args = parser.parse_args(argv)
+
+    conn = get_db()
+    if conn is None:
+        return 1
+
+    conn.start_transaction()
+    cur = conn.cursor()
+    rows = rebuild(cur, args.user)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    print(f"adherence_daily rebuilt: {rows} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
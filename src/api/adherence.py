@@ -0,0 +1,83 @@
+from flask import Blueprint, request, jsonify
+from src.db import get_db
+from src.api.medications import token_required
+import datetime
+
+adherence_bp = Blueprint("adherence", __name__)
+
+PERIODS = {
+    "day": "DATE_FORMAT(day, '%%Y-%%m-%%d')",
+    "week": "DATE_FORMAT(DATE_SUB(day, INTERVAL WEEKDAY(day) DAY), '%%Y-%%m-%%d')",
+    "month": "DATE_FORMAT(day, '%%Y-%%m')",
+}
+
+
+@adherence_bp.route("/api/adherence/summary", methods=["GET"])
+@token_required
+def get_summary(user_id):
+    """
+    Adherence totals from the adherence_daily rollup only.
+
+    Query params:
+      from, to - YYYY-MM-DD, inclusive (default: the last 30 days)
+      group    - day | week | month (default: day); weeks start on Monday
+      med_id   - optional, restrict to one medication
+    """
+    group = request.args.get("group", "day")
+    if group not in PERIODS:
+        return jsonify({"error": "group must be day, week or month"}), 400
+
+    try:
+        date_to = datetime.date.fromisoformat(request.args.get("to") or datetime.date.today().isoformat())
+        date_from = datetime.date.fromisoformat(
+            request.args.get("from") or (date_to - datetime.timedelta(days=29)).isoformat())
+    except ValueError:
+        return jsonify({"error": "Invalid date"}), 400
+
+    med_id = request.args.get("med_id", type=int)
+
+    sql = """
+        SELECT """ + PERIODS[group] + """ AS period,
+               SUM(scheduled) AS scheduled,
+               SUM(taken) AS taken,
+               SUM(missed) AS missed,
+               SUM(snoozed) AS snoozed
+        FROM adherence_daily
+        WHERE user_id = %s
+          AND day >= %s AND day <= %s
+    """
+    params = [user_id, date_from, date_to]
+    if med_id is not None:
+        sql += " AND med_id = %s"
+        params.append(med_id)
+    sql += " GROUP BY period ORDER BY period"
+
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+    cur.execute(sql, tuple(params))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    periods = []
+    totals = {"scheduled": 0, "taken": 0, "missed": 0, "snoozed": 0}
+    for row in rows:
+        counts = {key: int(row[key] or 0) for key in totals}
+        for key, value in counts.items():
+            totals[key] += value
+        periods.append(dict(
+            counts,
+            period=row["period"],
+            adherence=round(counts["taken"] / counts["scheduled"], 4) if counts["scheduled"] else None
+        ))
+
+    return jsonify({
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "group": group,
+        "periods": periods,
+        "totals": dict(
+            totals,
+            adherence=round(totals["taken"] / totals["scheduled"], 4) if totals["scheduled"] else None
+        )
+    })
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt, datetime, os
 from src.db import get_db
+from src.deletion import create_job, start_job
 
 auth_bp = Blueprint('auth', __name__)
 JWT_SECRET = os.getenv("JWT_SECRET", "super_secret_key123")
@@ -127,13 +128,15 @@ def delete_account():
         conn = get_db()
         cur = conn.cursor()
 
-        cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
-        conn.commit()
+        # Dependent rows are removed in chunks by a background job,
+        # the users row last; GET /api/jobs/<job_id> reports progress.
+        job_id = create_job(cur, "account", user_id, user_id)
 
         cur.close()
         conn.close()
 
-        return jsonify({"status": "deleted"}), 200
+        start_job(job_id)
+        return jsonify({"status": "deleting", "job_id": job_id}), 202
 
     except Exception as e:
         print("Delete error:", e)
@@ -1,11 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify
+from src.device_codec import request_object, parse_id
 from src.scheduler.medication_scheduler import clear_alert
 
 ack_bp = Blueprint("ack", __name__)
 
 @ack_bp.route("/api/device/ack", methods=["POST"])
 def ack():
-    data = request.json
-    device_id = data.get("device_id")
+    device_id = parse_id(request_object().get("device_id"))
+    if device_id is None:
+        return jsonify({"error": "Missing device_id"}), 400
     clear_alert(device_id)
     return jsonify({"status": "cleared"})
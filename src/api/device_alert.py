@@ -1,25 +1,17 @@
 from flask import Blueprint, request, jsonify
 from src.db import get_db
-from datetime import datetime, timedelta
-import pytz
+from src.device_codec import request_object, parse_id
+from src.adherence import set_dose_status
+from src.data_version import bump_data_version
+from src.pairings import pairing_resolver
+from src.next_dose import get_next_dose, refresh_next_dose
+from src.scheduler.dose_queue import utcnow
 
 device_alert_bp = Blueprint("device_alert", __name__)
 
 
 def get_user_for_device(device_id):
-    conn = get_db()
-    cur = conn.cursor(dictionary=True)
-
-    cur.execute("""
-        SELECT user_id FROM device_pairings
-        WHERE device_id = %s AND active = 1
-        LIMIT 1
-    """, (device_id,))
-
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
-    return row["user_id"] if row else None
+    return pairing_resolver.user_for_device(device_id)
 
 
 
@@ -34,23 +26,17 @@ def get_alert_status():
     if not user_id:
         return jsonify({"should_alert": False}), 200
 
+    now = utcnow()
     conn = get_db()
-    cur = conn.cursor(dictionary=True)
-
-    
-    cur.execute("""
-        SELECT instance_id, med_id, scheduled_at, status
-        FROM dose_instances
-        WHERE med_id IN (SELECT med_id FROM medications WHERE user_id = %s)
-        ORDER BY scheduled_at ASC
-        LIMIT 1
-    """, (user_id,))
-
-    row = cur.fetchone()
-
-    if not row:
-        cur.close()
-        conn.close()
+    cur = conn.cursor()
+
+    # One primary-key read of the maintained next dose (src/next_dose.py)
+    instance_id, med_id, scheduled_time = get_next_dose(cur, user_id, now)
+
+    cur.close()
+    conn.close()
+
+    if instance_id is None:
         return jsonify({
             "should_alert": False,
             "led": False,
@@ -58,21 +44,12 @@ def get_alert_status():
             "vibration": False
         })
 
-    scheduled_time = row["scheduled_at"]
-    now = datetime.now()
-
-    
-    should_alert = (
-        row["status"] == "scheduled" and
-        scheduled_time <= now
-    )
-
-    cur.close()
-    conn.close()
+    # the next dose is always still 'scheduled'
+    should_alert = scheduled_time <= now
 
     return jsonify({
         "should_alert": should_alert,
-        "instance_id": row["instance_id"],
+        "instance_id": instance_id,
         "scheduled_at": scheduled_time.isoformat(),
         "led": should_alert,
         "sound": should_alert,
@@ -83,20 +60,18 @@ def get_alert_status():
 
 @device_alert_bp.route("/api/device/stop_alert", methods=["POST"])
 def stop_alert():
-    instance_id = request.json.get("instance_id")
+    instance_id = parse_id(request_object().get("instance_id"))
 
-    if not instance_id:
+    if instance_id is None:
         return jsonify({"error": "missing instance_id"}), 400
 
     conn = get_db()
+    conn.start_transaction()
     cur = conn.cursor()
 
-  
-    cur.execute("""
-        UPDATE dose_instances
-        SET status = 'missed'
-        WHERE instance_id = %s
-    """, (instance_id,))
+    doses = set_dose_status(cur, [instance_id], "missed")
+    bump_data_version(cur, [d[0] for d in doses.values()])
+    refresh_next_dose(cur, [d[0] for d in doses.values()])
 
     conn.commit()
     cur.close()
@@ -107,16 +82,18 @@ def stop_alert():
 
 @device_alert_bp.route("/api/device/ack_open", methods=["POST"])
 def ack_open():
-    instance_id = request.json.get("instance_id")
+    instance_id = parse_id(request_object().get("instance_id"))
+
+    if instance_id is None:
+        return jsonify({"error": "missing instance_id"}), 400
 
     conn = get_db()
+    conn.start_transaction()
     cur = conn.cursor()
 
-    cur.execute("""
-        UPDATE dose_instances
-        SET status = 'taken'
-        WHERE instance_id = %s
-    """, (instance_id,))
+    doses = set_dose_status(cur, [instance_id], "taken")
+    bump_data_version(cur, [d[0] for d in doses.values()])
+    refresh_next_dose(cur, [d[0] for d in doses.values()])
 
     conn.commit()
     cur.close()
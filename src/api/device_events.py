@@ -1,33 +1,40 @@
-from flask import Blueprint, request, jsonify
-from src.db import get_db
+from flask import Blueprint, jsonify
+from src.device_codec import request_payload
+from src.event_buffer import device_event_buffer, device_event_row
 
 device_events_bp = Blueprint('device_events', __name__)
 
-@device_events_bp.route("/api/device/event", methods=["POST"])
-def device_event():
-    data = request.json
-
-    device_id = data.get("device_id")
-    event_type = data.get("event_type")
-    source = data.get("source", "device")
-
-    if not device_id or not event_type:
-        return jsonify({"error": "Missing fields"}), 400
-
-    try:
-        db = get_db()
-        cursor = db.cursor()
+MAX_EVENTS = 500
 
-        cursor.execute("""
-            INSERT INTO device_events (device_id, event_type, source)
-            VALUES (%s, %s, %s)
-        """, (device_id, event_type, source))
 
-        db.commit()
-        cursor.close()
-
-        return jsonify({"status": "ok", "message": "Event logged"}), 201
-
-    except Exception as e:
-        print("DB Error:", e)
-        return jsonify({"status": "db_error"}), 500
+@device_events_bp.route("/api/device/event", methods=["POST"])
+def device_event():
+    """
+    Accepts one event object, an array of them, or {"events": [...]}.
+    Events are queued and written in batches by the buffer's writer
+    thread; a full buffer answers 429 and the device retries later.
+    """
+    data = request_payload()
+    if isinstance(data, dict) and isinstance(data.get("events"), list):
+        data = data["events"]
+    events = data if isinstance(data, list) else [data]
+
+    if not events or len(events) > MAX_EVENTS:
+        return jsonify({"error": f"Send between 1 and {MAX_EVENTS} events"}), 400
+
+    rows = []
+    for event in events:
+        row = device_event_row(event.get("device_id") if isinstance(event, dict) else None, event)
+        if row is None:
+            return jsonify({
+                "error": "Each event needs a positive integer device_id, an event_type "
+                         "(at most 64 characters) and an optional source (at most 32)"
+            }), 400
+        rows.append(row)
+
+    if not device_event_buffer.offer(rows):
+        response = jsonify({"status": "busy", "error": "Event buffer full"})
+        response.headers["Retry-After"] = "1"
+        return response, 429
+
+    return jsonify({"status": "ok", "message": "Event queued", "accepted": len(rows)}), 202
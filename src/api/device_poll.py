@@ -1,20 +1,35 @@
 from flask import Blueprint, request, jsonify
 from src.db import get_db
 from src.scheduler.medication_scheduler import get_alert_state
+from src.scheduler.device_hub import device_hub, TooManyWaiters
+from src.pairings import pairing_resolver
+import os
+
+WAIT_TIMEOUT = float(os.getenv("DEVICE_WAIT_TIMEOUT", 25))
+WAIT_TIMEOUT_MAX = float(os.getenv("DEVICE_WAIT_TIMEOUT_MAX", 55))
 
 device_poll_bp = Blueprint("device_poll", __name__)
 
 @device_poll_bp.route("/api/device/poll", methods=["GET"])
 def poll_device():
-    device_id = request.args.get("device_id")
+    device_id = request.args.get("device_id", type=int)
 
     if not device_id:
         return jsonify({"error": "Missing device_id"}), 400
 
+    # Settings belong to the user the device is paired with
+    user_id = pairing_resolver.user_for_device(device_id)
+    if user_id is None:
+        return jsonify({"error": "Device not paired"}), 404
+
     conn = get_db()
     cur = conn.cursor(dictionary=True)
 
-    cur.execute("SELECT * FROM notification_settings WHERE user_id = %s", (device_id,))
+    cur.execute("""
+        SELECT led_enabled, sound_enabled, vibration_enabled
+        FROM notification_settings
+        WHERE user_id = %s
+    """, (user_id,))
     row = cur.fetchone()
 
     cur.close()
@@ -27,6 +42,63 @@ def poll_device():
         "led": row["led_enabled"],
         "sound": row["sound_enabled"],
         "vibration": row["vibration_enabled"],
-        "alert": get_alert_state(int(device_id))
+        "alert": get_alert_state(device_id)
     })
 
+
+
+@device_poll_bp.route("/api/device/wait", methods=["GET"])
+def wait_device():
+    """
+    Long-poll replacement for /api/device/poll.
+
+    Query params:
+      device_id - required
+      since     - version from the previous response; omit on the first call
+      timeout   - seconds to hold the request (default DEVICE_WAIT_TIMEOUT)
+
+    Answers at once if the device's version differs from since, otherwise
+    holds the request until the alert state or notification settings
+    change. On timeout returns 204 and the device simply asks again.
+    When this process already holds DEVICE_WAIT_MAX_WAITERS long-polls
+    it answers 204 at once with Retry-After. No database connection is
+    held while waiting.
+    """
+    device_id = request.args.get("device_id", type=int)
+    if not device_id:
+        return jsonify({"error": "Missing device_id"}), 400
+
+    since = request.args.get("since", type=int)
+    timeout = min(request.args.get("timeout", WAIT_TIMEOUT, type=float), WAIT_TIMEOUT_MAX)
+
+    if since is None:
+        version = device_hub.version(device_id)
+    else:
+        try:
+            version = device_hub.wait(device_id, since, max(timeout, 0))
+        except TooManyWaiters:
+            return "", 204, {"Retry-After": "5"}
+        if version is None:
+            return "", 204
+
+    row = {}
+    user_id = pairing_resolver.user_for_device(device_id)
+    if user_id is not None:
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT led_enabled, sound_enabled, vibration_enabled
+            FROM notification_settings
+            WHERE user_id = %s
+        """, (user_id,))
+        row = cur.fetchone() or {}
+        cur.close()
+        conn.close()
+
+    return jsonify({
+        "version": version,
+        "led": row.get("led_enabled", False),
+        "sound": row.get("sound_enabled", False),
+        "vibration": row.get("vibration_enabled", False),
+        "alert": get_alert_state(device_id)
+    })
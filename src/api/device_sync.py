@@ -0,0 +1,209 @@
+from flask import Blueprint, jsonify
+from src.device_codec import request_object, positive_int
+from datetime import timedelta
+from src.db import get_db, insert_many
+from src.event_buffer import device_event_row
+from src.adherence import lock_doses, set_dose_status
+from src.data_version import bump_data_version, get_data_version
+from src.next_dose import get_next_dose, refresh_next_dose
+from src.pairings import pairing_resolver
+from src.scheduler.alert_state import alert_store
+from src.scheduler.device_hub import device_hub
+from src.scheduler.dose_queue import utcnow
+import json
+import os
+
+device_sync_bp = Blueprint("device_sync", __name__)
+
+UPCOMING_HOURS = int(os.getenv("DEVICE_SYNC_UPCOMING_HOURS", 24))
+UPCOMING_LIMIT = 50
+MAX_EVENTS = 500
+MAX_ACKS = 100
+
+# ack status -> dose_events.event_type
+ACK_EVENTS = {"taken": "ack_taken", "snoozed": "snooze", "missed": "miss"}
+
+
+def _apply_acks(cur, user_id, acks):
+    """
+    Dose acknowledgements from the device, applied like the app's batch
+    endpoint: only the user's own doses; a dose already in the requested
+    status is left alone and reported "unchanged". Returns (results,
+    taken) where taken tells whether any dose was marked taken.
+    """
+    wanted = {}
+    results = []
+    for ack in acks:
+        instance_id = ack.get("instance_id") if isinstance(ack, dict) else None
+        status = ack.get("status", "taken") if isinstance(ack, dict) else None
+        if not positive_int(instance_id) or status not in ACK_EVENTS:
+            results.append({"instance_id": instance_id, "result": "invalid"})
+            continue
+        wanted[instance_id] = status  # the last ack for a dose wins
+        results.append({"instance_id": instance_id, "result": "pending"})
+
+    doses = lock_doses(cur, wanted.keys(), user_id=user_id)
+
+    by_status = {}
+    events = []
+    for instance_id, status in wanted.items():
+        dose = doses.get(instance_id)
+        if dose is None or dose[3] == status:
+            continue
+        by_status.setdefault(status, {})[instance_id] = dose
+        events.append((instance_id, ACK_EVENTS[status], "device", json.dumps({"sync": True})))
+
+    for status, status_doses in by_status.items():
+        set_dose_status(cur, status_doses.keys(), status, doses=status_doses)
+    insert_many(cur, "INSERT INTO dose_events (instance_id, event_type, source, meta)", events)
+
+    changed = {instance_id for group in by_status.values() for instance_id in group}
+    for result in results:
+        if result["result"] != "pending":
+            continue
+        instance_id = result["instance_id"]
+        if instance_id not in doses:
+            result["result"] = "not_found"
+        elif instance_id in changed:
+            result["result"] = "applied"
+        else:
+            result["result"] = "unchanged"
+
+    return results, "taken" in by_status
+
+
+def _upcoming_doses(cur, user_id, device_id, now):
+    cur.execute("""
+        SELECT di.instance_id, di.med_id, m.name, di.scheduled_at,
+               (SELECT MIN(c.slot_number)
+                FROM compartment_assignments ca
+                JOIN compartments c ON c.compartment_id = ca.compartment_id
+                WHERE ca.med_id = m.med_id
+                  AND ca.removed_at IS NULL
+                  AND c.device_id = %s) AS slot_number
+        FROM medications m
+        JOIN dose_instances di ON di.med_id = m.med_id
+        WHERE m.user_id = %s
+          AND di.status = 'scheduled'
+          AND di.scheduled_at >= %s
+          AND di.scheduled_at < %s
+        ORDER BY di.scheduled_at, di.instance_id
+        LIMIT %s
+    """, (device_id, user_id, now - timedelta(hours=1), now + timedelta(hours=UPCOMING_HOURS),
+          UPCOMING_LIMIT))
+
+    return [{
+        "instance_id": instance_id,
+        "med_id": med_id,
+        "name": name,
+        "scheduled_at": scheduled_at.isoformat(),
+        "slot": slot_number,
+    } for instance_id, med_id, name, scheduled_at, slot_number in cur.fetchall()]
+
+
+@device_sync_bp.route("/api/device/sync", methods=["POST"])
+def device_sync():
+    """
+    One request per device cycle, replacing poll + alert_status + event posts.
+
+    Body:
+      device_id  - required
+      versions   - {"device": n, "data": n} from the previous response
+      events     - [{"event_type", "source"}], stored in device_events
+      acks       - [{"instance_id", "status": taken|snoozed|missed}]
+      clear_alert - true to silence the device's alert (like /api/device/ack)
+
+    Response always has "versions" and "alert". "settings" is included
+    only when the device version changed and "doses" (upcoming, next
+    DEVICE_SYNC_UPCOMING_HOURS) only when the user's data version changed.
+    """
+    data = request_object()
+
+    device_id = data.get("device_id")
+    if not positive_int(device_id):
+        return jsonify({"error": "Missing device_id"}), 400
+
+    known = data.get("versions") or {}
+    events = data.get("events") or []
+    acks = data.get("acks") or []
+    if not isinstance(known, dict):
+        return jsonify({"error": "versions must be an object"}), 400
+    if not isinstance(events, list) or not isinstance(acks, list):
+        return jsonify({"error": "events and acks must be arrays"}), 400
+    if len(events) > MAX_EVENTS or len(acks) > MAX_ACKS:
+        return jsonify({"error": f"At most {MAX_EVENTS} events and {MAX_ACKS} acks"}), 400
+
+    event_rows = []
+    for event in events:
+        row = device_event_row(device_id, event)
+        if row is None:
+            return jsonify({
+                "error": "Each event needs an event_type (at most 64 characters) "
+                         "and an optional source (at most 32)"
+            }), 400
+        event_rows.append(row)
+
+    user_id = pairing_resolver.user_for_device(device_id)
+    now = utcnow()
+
+    # Versions are read before the data they describe, so a concurrent
+    # write can only make the device fetch again, never miss a change.
+    device_version = device_hub.version(device_id)
+    response = {
+        "versions": {"device": device_version, "data": None},
+        "events": {"accepted": len(event_rows)},
+        "acks": [],
+        "alert": {"active": alert_store.get(device_id)[0], "should_alert": False},
+        "paired": user_id is not None,
+    }
+
+    conn = get_db()
+    conn.start_transaction()
+    cur = conn.cursor()
+
+    insert_many(cur, "INSERT INTO device_events (device_id, event_type, source)", event_rows)
+
+    taken = False
+    if user_id is not None:
+        if acks:
+            response["acks"], taken = _apply_acks(cur, user_id, acks)
+            if any(result["result"] == "applied" for result in response["acks"]):
+                bump_data_version(cur, [user_id])
+                refresh_next_dose(cur, [user_id], now)
+
+        data_version = get_data_version(cur, user_id)
+        response["versions"]["data"] = data_version
+
+        instance_id, _, scheduled_at = get_next_dose(cur, user_id, now)
+        response["alert"].update({
+            "should_alert": scheduled_at is not None and scheduled_at <= now,
+            "instance_id": instance_id,
+            "scheduled_at": scheduled_at.isoformat() if scheduled_at else None,
+        })
+
+        if known.get("device") != device_version:
+            cur.execute("""
+                SELECT sound_enabled, vibration_enabled, led_enabled
+                FROM notification_settings
+                WHERE user_id = %s
+            """, (user_id,))
+            row = cur.fetchone()
+            response["settings"] = {
+                "sound": bool(row[0]) if row else True,
+                "vibration": bool(row[1]) if row else True,
+                "led": bool(row[2]) if row else True,
+            }
+
+        if known.get("data") != data_version:
+            response["doses"] = _upcoming_doses(cur, user_id, device_id, now)
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    # After commit, through the hub so long-polling devices wake up too
+    if taken or data.get("clear_alert"):
+        device_hub.set_alert(device_id, False)
+        response["alert"]["active"] = False
+
+    return jsonify(response)
@@ -0,0 +1,32 @@
+from flask import Blueprint, jsonify
+from src.db import get_db
+from src.deletion import get_job
+from src.api.medications import token_required, clean
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+@jobs_bp.route("/api/jobs/<int:job_id>", methods=["GET"])
+@token_required
+def get_job_status(user_id, job_id):
+    conn = get_db()
+    cur = conn.cursor()
+    row = get_job(cur, job_id, user_id)
+    cur.close()
+    conn.close()
+
+    if row is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    job_id, kind, target_id, status, rows_deleted, current_table, error, created_at, updated_at = row
+    return jsonify({
+        "job_id": job_id,
+        "kind": kind,
+        "target_id": target_id,
+        "status": status,
+        "rows_deleted": rows_deleted,
+        "current_table": current_table,
+        "error": error,
+        "created_at": clean(created_at),
+        "updated_at": clean(updated_at),
+    }), 200
@@ -1,12 +1,32 @@
-from flask import Blueprint, request, jsonify
-from src.db import get_db
-import jwt, datetime, os
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
+from src.db import get_db, insert_many
+from src.scheduler.dose_queue import medication_changed, medication_deleted, utcnow
+from src.scheduler.expansion import CompiledSchedule, horizon, parse_time
+from src.adherence import lock_doses, set_dose_status, record_scheduled, record_removed
+from src.data_version import bump_data_version, conditional_get
+from src.next_dose import refresh_next_dose
+from src.cache import LRUCache
+from src.device_codec import positive_int
+from src.deletion import (
+    CHUNK_SIZE as DELETE_CHUNK_SIZE, medication_plan, run_plan, count_medication_rows,
+    create_job, start_job
+)
+import jwt, datetime, os, json, math
 from functools import wraps
 import datetime
 
 med_bp = Blueprint("medications", __name__)
 JWT_SECRET = os.getenv("JWT_SECRET", "super_secret_key123")
 
+# user_id -> assembled medication list (fetch_medications output).
+# With MED_CACHE_SHARED=1 entries are checked against the user's data
+# version, so writes handled by other workers invalidate them too.
+med_cache = LRUCache(
+    maxsize=int(os.getenv("MED_CACHE_SIZE", 1024)),
+    ttl=int(os.getenv("MED_CACHE_TTL", 300))
+)
+MED_CACHE_SHARED = os.getenv("MED_CACHE_SHARED", "1") == "1"
+
 
 # ---------------------------------------
 # Helper function to clean datetime values
@@ -18,6 +38,80 @@ def clean(value):
     return value
 
 
+# ---------------------------------------
+# Batched writes for schedule rows
+# ---------------------------------------
+def insert_med_times(cur, rule_id, times):
+    cur.executemany("""
+        INSERT INTO med_times (rule_id, hhmm, sort_order)
+        VALUES (%s, %s, %s)
+    """, [(rule_id, t, idx) for idx, t in enumerate(times)])
+
+
+def insert_dose_instances(cur, rows):
+    # rows: (med_id, scheduled_at). Existing (med_id, scheduled_at) pairs
+    # are left untouched thanks to the UNIQUE key.
+    return insert_many(
+        cur,
+        "INSERT INTO dose_instances (med_id, scheduled_at, status)",
+        [(med_id, scheduled_at, "scheduled") for med_id, scheduled_at in rows],
+        "ON DUPLICATE KEY UPDATE instance_id = instance_id"
+    )
+
+
+def delete_dose_instances(cur, instance_ids, chunk_size=500):
+    instance_ids = list(instance_ids)
+    for i in range(0, len(instance_ids), chunk_size):
+        chunk = instance_ids[i:i + chunk_size]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cur.execute("DELETE FROM dose_events WHERE instance_id IN (" + placeholders + ")", tuple(chunk))
+        cur.execute("DELETE FROM dose_instances WHERE instance_id IN (" + placeholders + ")", tuple(chunk))
+    return len(instance_ids)
+
+
+def schedule_key(repeat_type, day_mask, times, custom_start, custom_end):
+    """Normalized schedule, so a stored rule and a request can be compared."""
+    return (
+        repeat_type,
+        day_mask or None,
+        tuple(parse_time(t) for t in times or ()),
+        str(custom_start)[:10] if custom_start else None,
+        str(custom_end)[:10] if custom_end else None,
+    )
+
+
+def reconcile_dose_instances(cur, user_id, med_id, compiled):
+    """
+    Brings a medication's future doses in line with `compiled` by
+    diffing against what is stored: only doses that no longer fit the
+    schedule are deleted and only missing ones are inserted, so
+    unchanged doses keep their instance_id and events.
+    """
+    now = utcnow()
+    start, end = horizon()
+
+    cur.execute("""
+        SELECT instance_id, scheduled_at, status
+        FROM dose_instances
+        WHERE med_id = %s AND scheduled_at >= %s
+    """, (med_id, now))
+    existing = {scheduled_at: (instance_id, status) for instance_id, scheduled_at, status in cur.fetchall()}
+
+    wanted = {scheduled_at for _, scheduled_at in compiled.expand(med_id, start, end)
+              if scheduled_at >= now}
+
+    stale = [(scheduled_at, instance_id, status) for scheduled_at, (instance_id, status) in existing.items()
+             if scheduled_at not in wanted]
+    missing = [(med_id, scheduled_at) for scheduled_at in sorted(wanted.difference(existing))]
+
+    deleted = delete_dose_instances(cur, [instance_id for _, instance_id, _ in stale])
+    record_removed(cur, user_id, [(med_id, scheduled_at, status) for scheduled_at, _, status in stale])
+    inserted = insert_dose_instances(cur, missing)
+    record_scheduled(cur, user_id, missing)
+
+    return {"inserted": inserted, "deleted": deleted, "kept": len(existing) - deleted}
+
+
 # ---------------------------------------
 # TOKEN DECORATOR
 # ---------------------------------------
@@ -43,68 +137,83 @@ def token_required(f):
 
 
 # ---------------------------------------
-# GET ALL MEDICATIONS
+# Medication + schedule loader
 # ---------------------------------------
-@med_bp.route("/api/medications", methods=["GET"])
-@token_required
-def get_medications(user_id):
+def fetch_medications(cur, user_id, med_id=None):
+    """
+    Loads medications with their first schedule rule and its times in a
+    single query (one row per time) and assembles them in one pass.
+    """
+    sql = """
+        SELECT m.med_id, m.name, m.notes,
+               m.start_date AS active_start_date,
+               m.end_date AS active_end_date,
+               r.rule_id, r.repeat_type, r.day_mask, r.lead_minutes,
+               t.hhmm
+        FROM medications m
+        LEFT JOIN med_schedule_rules r
+               ON r.rule_id = (SELECT MIN(rule_id) FROM med_schedule_rules WHERE med_id = m.med_id)
+        LEFT JOIN med_times t ON t.rule_id = r.rule_id
+        WHERE m.user_id = %s
+    """
+    params = [user_id]
+    if med_id is not None:
+        sql += " AND m.med_id = %s"
+        params.append(med_id)
+    sql += " ORDER BY m.med_id, t.sort_order"
 
-    conn = get_db()
-    cur = conn.cursor(dictionary=True)
+    cur.execute(sql, tuple(params))
 
-    cur.execute("""
-        SELECT med_id, name, notes,
-               start_date AS active_start_date,
-               end_date AS active_end_date
-        FROM medications
-        WHERE user_id = %s
-    """, (user_id,))
-    
-    medications = cur.fetchall()
     results = []
+    current = None
+    for row in cur.fetchall():
+        if current is None or current["med_id"] != row["med_id"]:
+            has_rule = row["rule_id"] is not None
+            current = {
+                "med_id": row["med_id"],
+                "name": row["name"],
+                "notes": row["notes"],
+                "active_start_date": clean(row["active_start_date"]),
+                "active_end_date": clean(row["active_end_date"]),
+                "schedule": {
+                    "repeat_type": row["repeat_type"] if has_rule else None,
+                    "day_mask": row["day_mask"] if has_rule else None,
+                    "times": [],
+                    "custom_start": None,
+                    "custom_end": None,
+                    "lead_minutes": int(row["lead_minutes"] or 0) if has_rule else 0
+                }
+            }
+            results.append(current)
 
-    for med in medications:
-        med_id = med["med_id"]
+        if row["hhmm"] is not None:
+            current["schedule"]["times"].append(clean(row["hhmm"]))
 
-        # Get schedule rule
-        cur.execute("""
-            SELECT rule_id, repeat_type, day_mask, lead_minutes
-            FROM med_schedule_rules
-            WHERE med_id = %s
-            LIMIT 1
-        """, (med_id,))
-        rule = cur.fetchone()
+    return results
 
-        # Get times
-        times = []
-        lead_minutes = 0
 
-        if rule:
-            lead_minutes = int(rule.get("lead_minutes", 0))
+def load_medications(cur, user_id):
+    """fetch_medications() for a whole user, through med_cache."""
+    version = g.get("data_version") if MED_CACHE_SHARED else None
+    medications = med_cache.get(user_id, version)
+    if medications is None:
+        medications = fetch_medications(cur, user_id)
+        med_cache.put(user_id, medications, version)
+    return medications
 
-            cur.execute("""
-                SELECT hhmm
-                FROM med_times
-                WHERE rule_id = %s
-                ORDER BY sort_order
-            """, (rule["rule_id"],))
-            times = [clean(row["hhmm"]) for row in cur.fetchall()]
-
-        results.append({
-            "med_id": med["med_id"],
-            "name": med["name"],
-            "notes": med["notes"],
-            "active_start_date": clean(med["active_start_date"]),
-            "active_end_date": clean(med["active_end_date"]),
-            "schedule": {
-                "repeat_type": rule["repeat_type"] if rule else None,
-                "day_mask": rule["day_mask"] if rule else None,
-                "times": times,
-                "custom_start": None,
-                "custom_end": None,
-                "lead_minutes": lead_minutes
-            }
-        })
+
+# ---------------------------------------
+# GET ALL MEDICATIONS
+# ---------------------------------------
+@med_bp.route("/api/medications", methods=["GET"])
+@token_required
+@conditional_get
+def get_medications(user_id):
+
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+
+    results = load_medications(cur, user_id)
 
     cur.close()
     conn.close()
@@ -117,142 +226,238 @@ def get_medications(user_id):
 # ---------------------------------------
 @med_bp.route("/api/medications/<int:med_id>", methods=["GET"])
 @token_required
+@conditional_get
 def get_medication_by_id(user_id, med_id):
 
     conn = get_db()
     cur = conn.cursor(dictionary=True)
 
-    cur.execute("""
-        SELECT med_id, name, notes,
-               start_date AS active_start_date,
-               end_date AS active_end_date
-        FROM medications
-        WHERE med_id = %s AND user_id = %s
-    """, (med_id, user_id))
+    results = [med for med in load_medications(cur, user_id) if med["med_id"] == med_id]
+
+    cur.close()
+    conn.close()
 
-    med = cur.fetchone()
-    if not med:
+    if not results:
         return jsonify({"error": "Medication not found"}), 404
 
-    cur.execute("""
-        SELECT rule_id, repeat_type, day_mask, lead_minutes
-        FROM med_schedule_rules
-        WHERE med_id = %s
-        LIMIT 1
-    """, (med_id,))
-    rule = cur.fetchone()
+    return jsonify(results[0])
 
-    times = []
-    lead_minutes = 0
 
-    if rule:
-        lead_minutes = int(rule.get("lead_minutes", 0))
+# ---------------------------------------
+# GET MEDICATION HISTORY
+# ---------------------------------------
+HISTORY_MAX_LIMIT = 500
 
-        cur.execute("""
-            SELECT hhmm FROM med_times
-            WHERE rule_id = %s
-            ORDER BY sort_order
-        """, (rule["rule_id"],))
-        times = [clean(row["hhmm"]) for row in cur.fetchall()]
-
-    result = {
-        "med_id": med["med_id"],
-        "name": med["name"],
-        "notes": med["notes"],
-        "active_start_date": clean(med["active_start_date"]),
-        "active_end_date": clean(med["active_end_date"]),
-        "schedule": {
-            "repeat_type": rule["repeat_type"] if rule else None,
-            "day_mask": rule["day_mask"] if rule else None,
-            "times": times,
-            "custom_start": None,
-            "custom_end": None,
-            "lead_minutes": lead_minutes
-        }
+
+def encode_history_cursor(row):
+    return row["scheduled_at"].strftime("%Y-%m-%dT%H:%M:%S") + "_" + str(row["instance_id"])
+
+
+def decode_history_cursor(value):
+    scheduled_at, instance_id = value.rsplit("_", 1)
+    return datetime.datetime.fromisoformat(scheduled_at), int(instance_id)
+
+
+def history_item(row):
+    return {
+        "id": row["med_id"],
+        "name": row["name"],
+        "scheduledTime": clean(row["scheduled_at"].strftime("%H:%M")),
+        "status": row["status"]
     }
 
-    cur.close()
-    conn.close()
-    return jsonify(result)
+
+def stream_history(cur):
+    """
+    Writes the day-grouped history JSON row by row from an unbuffered
+    cursor. Rows arrive newest first, so each day is contiguous.
+    """
+    try:
+        yield "["
+        day = None
+        for row in cur:
+            row_day = clean(row["scheduled_at"].date())
+            if row_day != day:
+                if day is not None:
+                    yield "]},"
+                yield '{"date": ' + json.dumps(row_day) + ', "medications": ['
+                day = row_day
+            else:
+                yield ","
+            yield json.dumps(history_item(row))
+        if day is not None:
+            yield "]}"
+        yield "]"
+    finally:
+        # An aborted download leaves rows unread; the pool drains them on release
+        try:
+            cur.close()
+        except Exception:
+            pass
 
 
-# ---------------------------------------
-# GET MEDICATION HISTORY
-# ---------------------------------------
 @med_bp.route("/api/medications/history", methods=["GET"])
 @token_required
 def get_history(user_id):
-
-    conn = get_db()
-    cur = conn.cursor(dictionary=True)
-
-    cur.execute("""
+    """
+    Past doses grouped by day, newest first.
+
+    Query params:
+      from, to  - optional YYYY-MM-DD bounds (inclusive)
+      limit     - page size, 1..HISTORY_MAX_LIMIT (larger values are
+                  capped); returns {"days": [...], "next_before": cursor}
+      before    - cursor from a previous page's next_before
+
+    Without limit/before the full history is streamed as the original
+    [{"date", "medications"}] list, without loading it into memory.
+    """
+    limit = request.args.get("limit")
+    if limit is not None:
+        if not limit.isdigit() or int(limit) == 0:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+        limit = int(limit)
+    before = request.args.get("before")
+    date_from = request.args.get("from")
+    date_to = request.args.get("to")
+
+    sql = """
         SELECT di.instance_id, di.scheduled_at, di.status,
-            m.med_id, m.name,
-            DATE(di.scheduled_at) as day
+            m.med_id, m.name
         FROM dose_instances di
         JOIN medications m ON m.med_id = di.med_id
         WHERE m.user_id = %s
         AND di.scheduled_at <= NOW()
-        ORDER BY di.scheduled_at DESC
-    """, (user_id,))
+    """
+    params = [user_id]
 
+    try:
+        if date_from:
+            sql += " AND di.scheduled_at >= %s"
+            params.append(datetime.date.fromisoformat(date_from))
+        if date_to:
+            sql += " AND di.scheduled_at < %s"
+            params.append(datetime.date.fromisoformat(date_to) + datetime.timedelta(days=1))
+        if before:
+            before_at, before_id = decode_history_cursor(before)
+            sql += " AND (di.scheduled_at < %s OR (di.scheduled_at = %s AND di.instance_id < %s))"
+            params.extend([before_at, before_at, before_id])
+    except ValueError:
+        return jsonify({"error": "Invalid date or cursor"}), 400
+
+    sql += " ORDER BY di.scheduled_at DESC, di.instance_id DESC"
 
+    conn = get_db()
 
+    if limit is None and before is None:
+        cur = conn.cursor(dictionary=True, buffered=False)
+        cur.execute(sql, tuple(params))
+        return Response(stream_with_context(stream_history(cur)), mimetype="application/json")
 
+    limit = min(limit or HISTORY_MAX_LIMIT, HISTORY_MAX_LIMIT)
+    sql += " LIMIT %s"
+    params.append(limit + 1)
 
+    cur = conn.cursor(dictionary=True)
+    cur.execute(sql, tuple(params))
     rows = cur.fetchall()
+    cur.close()
+    conn.close()
 
-    history = {}
-    for row in rows:
-        day = clean(row["day"])
-        if day not in history:
-            history[day] = []
+    next_before = encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
 
-        history[day].append({
-            "id": row["med_id"],
-            "name": row["name"],
-            "scheduledTime": clean(row["scheduled_at"].strftime("%H:%M")),
-            "status": row["status"]
-        })
-
-    result = [{"date": day, "medications": meds} for day, meds in history.items()]
+    days = []
+    for row in rows:
+        day = clean(row["scheduled_at"].date())
+        if not days or days[-1]["date"] != day:
+            days.append({"date": day, "medications": []})
+        days[-1]["medications"].append(history_item(row))
 
-    cur.close()
-    conn.close()
-    return jsonify(result)
+    return jsonify({"days": days, "next_before": next_before})
 
 
-@med_bp.route("/api/calendar/day", methods=["GET"])
-@token_required
-def get_day(user_id):
-    date = request.args.get("date")
+CALENDAR_MAX_DAYS = 62
 
-    conn = get_db()
-    cur = conn.cursor(dictionary=True)
 
+def fetch_calendar(cur, user_id, start, end):
+    """
+    Doses for the user's medications in [start, end), grouped by day.
+    The half-open scheduled_at range can use the (med_id, scheduled_at)
+    key, unlike DATE(scheduled_at) = ...
+    """
     cur.execute("""
         SELECT di.instance_id, di.scheduled_at, di.status,
                m.name
         FROM dose_instances di
         JOIN medications m ON m.med_id = di.med_id
         WHERE m.user_id = %s
-          AND DATE(di.scheduled_at) = %s
+          AND di.scheduled_at >= %s
+          AND di.scheduled_at < %s
         ORDER BY di.scheduled_at ASC
-    """, (user_id, date))
+    """, (user_id, start, end))
 
-    rows = cur.fetchall()
+    days = {}
+    day = start
+    while day < end:
+        days[day.isoformat()] = []
+        day += datetime.timedelta(days=1)
 
-    result = []
-    for row in rows:
-        result.append({
+    for row in cur.fetchall():
+        days[row["scheduled_at"].date().isoformat()].append({
             "instance_id": row["instance_id"],
             "name": row["name"],
             "time": row["scheduled_at"].strftime("%H:%M"),
             "status": row["status"]
         })
 
-    return jsonify(result)
+    return days
+
+
+@med_bp.route("/api/calendar/day", methods=["GET"])
+@token_required
+@conditional_get
+def get_day(user_id):
+    try:
+        date = datetime.date.fromisoformat(request.args.get("date", ""))
+    except ValueError:
+        return jsonify({"error": "Invalid date"}), 400
+
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+
+    days = fetch_calendar(cur, user_id, date, date + datetime.timedelta(days=1))
+
+    cur.close()
+    conn.close()
+
+    return jsonify(days[date.isoformat()])
+
+
+@med_bp.route("/api/calendar/range", methods=["GET"])
+@token_required
+@conditional_get
+def get_range(user_id):
+    """Doses for every day from `from` to `to` inclusive: {"YYYY-MM-DD": [...]}."""
+    try:
+        date_from = datetime.date.fromisoformat(request.args.get("from", ""))
+        date_to = datetime.date.fromisoformat(request.args.get("to", ""))
+    except ValueError:
+        return jsonify({"error": "Invalid date"}), 400
+
+    if date_to < date_from:
+        return jsonify({"error": "'to' is before 'from'"}), 400
+    if (date_to - date_from).days >= CALENDAR_MAX_DAYS:
+        return jsonify({"error": f"Range is limited to {CALENDAR_MAX_DAYS} days"}), 400
+
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+
+    days = fetch_calendar(cur, user_id, date_from, date_to + datetime.timedelta(days=1))
+
+    cur.close()
+    conn.close()
+
+    return jsonify(days)
 
 
 @med_bp.route("/api/dose/mark_taken", methods=["POST"])
@@ -261,20 +466,20 @@ def mark_taken(user_id):
     instance_id = request.json.get("instance_id")
 
     conn = get_db()
+    conn.start_transaction()
     cur = conn.cursor()
 
+    # update dose (and the adherence rollup)
+    doses = set_dose_status(cur, [instance_id], "taken")
+    bump_data_version(cur, [d[0] for d in doses.values()])
+    refresh_next_dose(cur, [d[0] for d in doses.values()])
+
     # add event
     cur.execute("""
         INSERT INTO dose_events (instance_id, event_type, source)
         VALUES (%s, 'ack_taken', 'app')
     """, (instance_id,))
 
-    # update dose
-    cur.execute("""
-        UPDATE dose_instances SET status = 'taken'
-        WHERE instance_id = %s
-    """, (instance_id,))
-
     conn.commit()
     cur.close()
     conn.close()
@@ -289,14 +494,13 @@ def update_dose(user_id):
     status = request.json.get("status")
 
     conn = get_db()
+    conn.start_transaction()
     cur = conn.cursor()
 
-    # UPDATE first (very fast)
-    cur.execute("""
-        UPDATE dose_instances
-        SET status = %s
-        WHERE instance_id = %s
-    """, (status, instance_id))
+    # UPDATE first (very fast), rollup counters move with it
+    doses = set_dose_status(cur, [instance_id], status)
+    bump_data_version(cur, [d[0] for d in doses.values()])
+    refresh_next_dose(cur, [d[0] for d in doses.values()])
 
     # EVENT insert separately, no lock conflict
     try:
@@ -313,6 +517,114 @@ def update_dose(user_id):
 
     return jsonify({"status": status})
 
+
+DOSE_STATUSES = ("scheduled", "taken", "snoozed", "missed", "cancelled")
+STATUS_EVENTS = {"taken": "ack_taken", "snoozed": "snooze", "missed": "miss", "cancelled": "cancel"}
+BATCH_MAX_OPS = 500
+
+
+def parse_client_ts(value):
+    """
+    client_ts as UTC epoch seconds: a number (seconds, or milliseconds
+    when above 1e11) or an ISO 8601 string, naive meaning UTC. A missing
+    value sorts before every other; raises ValueError if unparseable.
+    """
+    if value is None:
+        return float("-inf")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if not math.isfinite(value):
+            raise ValueError("client_ts is not finite")
+        return value / 1000 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    raise ValueError("client_ts must be a number or an ISO 8601 string")
+
+
+@med_bp.route("/api/dose/batch", methods=["POST"])
+@token_required
+def batch_update_doses(user_id):
+    """
+    Applies queued dose status changes in one transaction.
+
+    Body: {"operations": [{"instance_id", "status", "client_ts"}, ...]}
+    client_ts is epoch seconds/milliseconds or an ISO 8601 datetime (see
+    parse_client_ts). When the same dose appears more than once the
+    latest client_ts wins. Returns one result per operation, in order:
+    applied, superseded, not_found (missing or not this user's dose) or
+    invalid.
+    """
+    data = request.json or {}
+    operations = data.get("operations")
+    if not isinstance(operations, list):
+        return jsonify({"error": "operations must be a list"}), 400
+    if len(operations) > BATCH_MAX_OPS:
+        return jsonify({"error": f"At most {BATCH_MAX_OPS} operations per batch"}), 400
+
+    results = []
+    latest = {}  # instance_id -> index of the winning operation
+    client_ts = {}  # index -> parsed client_ts
+    for idx, op in enumerate(operations):
+        op = op if isinstance(op, dict) else {}
+        instance_id = op.get("instance_id")
+        status = op.get("status")
+        results.append({"instance_id": instance_id, "status": status, "result": "invalid"})
+
+        if not positive_int(instance_id) or status not in DOSE_STATUSES:
+            continue
+        try:
+            client_ts[idx] = parse_client_ts(op.get("client_ts"))
+        except ValueError:
+            continue
+
+        results[idx]["result"] = "pending"
+        previous = latest.get(instance_id)
+        if previous is None or client_ts[idx] >= client_ts[previous]:
+            if previous is not None:
+                results[previous]["result"] = "superseded"
+            latest[instance_id] = idx
+        else:
+            results[idx]["result"] = "superseded"
+
+    conn = get_db()
+    conn.start_transaction()
+    cur = conn.cursor()
+
+    # Ownership check for every dose in one query
+    owned = lock_doses(cur, latest, user_id=user_id)
+
+    by_status = {}
+    events = []
+    for instance_id, idx in latest.items():
+        if instance_id not in owned:
+            results[idx]["result"] = "not_found"
+            continue
+        status = operations[idx]["status"]
+        by_status.setdefault(status, {})[instance_id] = owned[instance_id]
+        if status in STATUS_EVENTS:
+            meta = json.dumps({"client_ts": operations[idx].get("client_ts"), "batch": True})
+            events.append((instance_id, STATUS_EVENTS[status], "app", meta))
+        results[idx]["result"] = "applied"
+
+    for status, doses in by_status.items():
+        set_dose_status(cur, doses.keys(), status, doses=doses)
+
+    insert_many(cur, "INSERT INTO dose_events (instance_id, event_type, source, meta)", events)
+
+    if by_status:
+        bump_data_version(cur, [user_id])
+        refresh_next_dose(cur, [user_id])
+
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    applied = sum(1 for r in results if r["result"] == "applied")
+    return jsonify({"applied": applied, "results": results})
+
+
 @med_bp.route("/api/medications", methods=["POST"])
 @token_required
 def create_medication(user_id):
@@ -334,6 +646,7 @@ def create_medication(user_id):
         day_mask = "1111111"
 
     conn = get_db()
+    conn.start_transaction()
     cur = conn.cursor()
 
    
@@ -350,53 +663,22 @@ def create_medication(user_id):
     """, (med_id, repeat_type, day_mask, custom_start, custom_end))
     rule_id = cur.lastrowid
 
-   
-    for idx, t in enumerate(times):
-        cur.execute("""
-            INSERT INTO med_times (rule_id, hhmm, sort_order)
-            VALUES (%s, %s, %s)
-        """, (rule_id, t, idx))
+    insert_med_times(cur, rule_id, times)
 
-    
-    import datetime
-    today = datetime.date.today()
-
-    def weekly_match(day):
-        return day_mask and day_mask[day.weekday()] == "1"
-
-    for i in range(30):
-        day = today + datetime.timedelta(days=i)
-        should = False
-
-        if repeat_type == "daily":
-            should = True
-        elif repeat_type == "weekly":
-            should = weekly_match(day)
-        elif repeat_type == "once":
-            should = (custom_start == day.isoformat())
-        elif repeat_type == "custom":
-            start = datetime.date.fromisoformat(custom_start)
-            end = datetime.date.fromisoformat(custom_end)
-            should = (start <= day <= end)
-
-        if not should:
-            continue
-
-        for t in times:
-            hour, minute = map(int, t.split(":"))
-            dt = datetime.datetime.combine(
-    day,
-    datetime.time(hour, minute, tzinfo=datetime.timezone.utc)
-)
-            cur.execute("""
-                INSERT INTO dose_instances (med_id, scheduled_at, status)
-                VALUES (%s, %s, 'scheduled')
-            """, (med_id, dt))
+    compiled = CompiledSchedule(repeat_type, times, day_mask, custom_start, custom_end)
+    doses = list(compiled.expand(med_id, *horizon()))
+    insert_dose_instances(cur, doses)
+    record_scheduled(cur, user_id, doses)
+    bump_data_version(cur, [user_id])
+    refresh_next_dose(cur, [user_id])
 
     conn.commit()
     cur.close()
     conn.close()
 
+    med_cache.invalidate(user_id)
+    medication_changed(med_id)
+
     return jsonify({"status": "created", "med_id": med_id}), 201
 
 
@@ -422,6 +704,7 @@ def update_medication(user_id, med_id):
         day_mask = "1111111"
 
     conn = get_db()
+    conn.start_transaction()
     cur = conn.cursor()
 
     
@@ -433,92 +716,78 @@ def update_medication(user_id, med_id):
     
     cur.execute("""
         UPDATE medications
-        SET name = %s, notes = %s
+        SET name = %s, notes = %s, updated_at = NOW()
         WHERE med_id = %s AND user_id = %s
     """, (name, notes, med_id, user_id))
 
    
-    cur.execute("SELECT rule_id FROM med_schedule_rules WHERE med_id = %s", (med_id,))
+    cur.execute("""
+        SELECT rule_id, repeat_type, day_mask, custom_start, custom_end
+        FROM med_schedule_rules
+        WHERE med_id = %s
+        LIMIT 1
+    """, (med_id,))
     rule = cur.fetchone()
 
-    if rule is None:
-        cur.execute("""
-            INSERT INTO med_schedule_rules (med_id, repeat_type, day_mask, custom_start, custom_end)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (med_id, repeat_type, day_mask, custom_start, custom_end))
-        rule_id = cur.lastrowid
-    else:
-        rule_id = rule[0]
+    old_times = []
+    if rule is not None:
         cur.execute("""
-            UPDATE med_schedule_rules
-            SET repeat_type = %s,
-                day_mask = %s,
-                custom_start = %s,
-                custom_end = %s
+            SELECT hhmm FROM med_times
             WHERE rule_id = %s
-        """, (repeat_type, day_mask, custom_start, custom_end, rule_id))
-
-    cur.execute("DELETE FROM med_times WHERE rule_id = %s", (rule_id,))
-    for idx, t in enumerate(times):
-        cur.execute("""
-            INSERT INTO med_times (rule_id, hhmm, sort_order)
-            VALUES (%s, %s, %s)
-        """, (rule_id, t, idx))
-
-   
-    cur.execute("""
-        DELETE FROM dose_events WHERE instance_id IN (
-            SELECT instance_id FROM dose_instances
-            WHERE med_id = %s AND scheduled_at >= NOW()
-        )
-    """, (med_id,))
-
-    cur.execute("""
-        DELETE FROM dose_instances
-        WHERE med_id = %s AND scheduled_at >= NOW()
-    """, (med_id,))
+            ORDER BY sort_order
+        """, (rule[0],))
+        old_times = [row[0] for row in cur.fetchall()]
+
+    new_key = schedule_key(repeat_type, day_mask, times, custom_start, custom_end)
+    old_key = None
+    if rule is not None:
+        _, old_repeat, old_mask, old_start, old_end = rule
+        old_key = schedule_key(old_repeat, old_mask, old_times, old_start, old_end)
+    schedule_changed = old_key != new_key
+    doses = {"inserted": 0, "deleted": 0, "kept": 0}
+
+    # Name/notes-only edits stop here: no rule, time or dose writes
+    if schedule_changed:
+        if rule is None:
+            cur.execute("""
+                INSERT INTO med_schedule_rules (med_id, repeat_type, day_mask, custom_start, custom_end)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (med_id, repeat_type, day_mask, custom_start, custom_end))
+            rule_id = cur.lastrowid
+        else:
+            rule_id = rule[0]
+            cur.execute("""
+                UPDATE med_schedule_rules
+                SET repeat_type = %s,
+                    day_mask = %s,
+                    custom_start = %s,
+                    custom_end = %s
+                WHERE rule_id = %s
+            """, (repeat_type, day_mask, custom_start, custom_end, rule_id))
 
-    import datetime
-    today = datetime.date.today()
-
-    def matches_weekly(date, mask):
-        return mask[date.weekday()] == "1"
-
-    for i in range(30):
-        day = today + datetime.timedelta(days=i)
-        should_create = False
-
-        if repeat_type == "daily":
-            should_create = True
-        elif repeat_type == "weekly" and day_mask:
-            should_create = matches_weekly(day, day_mask)
-        elif repeat_type == "once" and custom_start:
-            should_create = (day.isoformat() == custom_start)
-        elif repeat_type == "custom" and custom_start and custom_end:
-            start = datetime.date.fromisoformat(custom_start)
-            end = datetime.date.fromisoformat(custom_end)
-            should_create = start <= day <= end
-
-        if not should_create:
-            continue
+        if old_key is None or old_key[2] != new_key[2]:
+            cur.execute("DELETE FROM med_times WHERE rule_id = %s", (rule_id,))
+            insert_med_times(cur, rule_id, times)
 
-        for t in times:
-            hour, minute = map(int, t.split(":"))
-            scheduled_at = datetime.datetime.combine(
-    day,
-    datetime.time(hour, minute, tzinfo=datetime.timezone.utc)
-)
+        compiled = CompiledSchedule(repeat_type, times, day_mask, custom_start, custom_end)
+        doses = reconcile_dose_instances(cur, user_id, med_id, compiled)
+        refresh_next_dose(cur, [user_id])
 
-            cur.execute("""
-                INSERT INTO dose_instances (med_id, scheduled_at, status)
-                VALUES (%s, %s, 'scheduled')
-            """, (med_id, scheduled_at))
+    bump_data_version(cur, [user_id])
 
     conn.commit()
     cur.close()
     conn.close()
 
-    return jsonify({"status": "updated"}), 200
+    med_cache.invalidate(user_id)
+    if schedule_changed:
+        medication_changed(med_id)
+
+    return jsonify({
+        "status": "updated",
+        "schedule_changed": schedule_changed,
+        "doses": doses
+    }), 200
 
 
 @med_bp.route("/api/medications/<int:med_id>", methods=["DELETE"])
@@ -527,35 +796,34 @@ def delete_medication(user_id, med_id):
     conn = get_db()
     cur = conn.cursor()
 
-    # Remove dose events first
-    cur.execute("""
-        DELETE de FROM dose_events de
-        JOIN dose_instances di ON de.instance_id = di.instance_id
-        WHERE di.med_id = %s
-    """, (med_id,))
-
-    # Remove dose instances
-    cur.execute("DELETE FROM dose_instances WHERE med_id = %s", (med_id,))
-
-    # Remove med_times
-    cur.execute("""
-        DELETE FROM med_times
-        WHERE rule_id IN (SELECT rule_id FROM med_schedule_rules WHERE med_id = %s)
-    """, (med_id,))
-
-    # Remove schedule rules
-    cur.execute("DELETE FROM med_schedule_rules WHERE med_id = %s", (med_id,))
-
-    cur.execute("DELETE FROM compartment_assignments WHERE med_id = %s", (med_id,))
-
-    # Finally delete medication row
     cur.execute(
-        "DELETE FROM medications WHERE med_id = %s AND user_id = %s",
+        "SELECT 1 FROM medications WHERE med_id = %s AND user_id = %s",
         (med_id, user_id)
     )
+    if cur.fetchone() is None:
+        cur.close()
+        conn.close()
+        return jsonify({"error": "Medication not found"}), 404
 
-    conn.commit()
+    # Small medications are removed inline, chunk by chunk; large ones
+    # (years of dose history) go to a background job the client can poll.
+    if count_medication_rows(cur, med_id) > DELETE_CHUNK_SIZE:
+        job_id = create_job(cur, "medication", user_id, med_id)
+        cur.close()
+        conn.close()
+
+        med_cache.invalidate(user_id)
+        medication_deleted(med_id)
+        start_job(job_id)
+        return jsonify({"status": "deleting", "job_id": job_id}), 202
+
+    run_plan(conn, medication_plan(med_id))
+    bump_data_version(cur, [user_id])
+    refresh_next_dose(cur, [user_id])
     cur.close()
     conn.close()
 
+    med_cache.invalidate(user_id)
+    medication_deleted(med_id)
+
     return jsonify({"status": "deleted"}), 200
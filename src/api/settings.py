@@ -1,16 +1,15 @@
 from flask import Blueprint, request, jsonify
 from src.db import get_db
+from src.scheduler.device_hub import device_hub
+from src.pairings import pairing_resolver
 import jwt
 import os
 from functools import wraps
-import paho.mqtt.publish as publish
+from src.mqtt.publisher import publish_prefs
 
 settings_bp = Blueprint("settings", __name__)
 JWT_SECRET = os.getenv("JWT_SECRET", "super_secret_key123")
 
-MQTT_BROKER = "172.20.10.3"
-MQTT_TOPIC = "pillpal/device/commands"
-
 
 def token_required(f):
     @wraps(f)
@@ -70,27 +69,13 @@ def update_settings(user_id):
     cur.close()
     conn.close()
 
-    # Send MQTT updates
-    try:
-        publish.single(
-            MQTT_TOPIC,
-            payload="SET_PREF_SOUND_" + ("ON" if sound else "OFF"),
-            hostname=MQTT_BROKER
-        )
-
-        publish.single(
-            MQTT_TOPIC,
-            payload="SET_PREF_VIB_" + ("ON" if vibration else "OFF"),
-            hostname=MQTT_BROKER
-        )
-
-        publish.single(
-            MQTT_TOPIC,
-            payload="SET_PREF_LED_" + ("ON" if led else "OFF"),
-            hostname=MQTT_BROKER
-        )
-
-    except Exception as e:
-        print("MQTT publish error:", e)
+    # Wake devices long-polling /api/device/wait
+    device_ids = pairing_resolver.devices_for_user(user_id)
+    for device_id in device_ids:
+        device_hub.touch(device_id)
+
+    # Queued for the background publisher; never waits on the broker
+    if not publish_prefs(device_ids, sound, vibration, led):
+        print("MQTT publish queue full, settings command dropped")
 
     return jsonify({"status": "updated"})
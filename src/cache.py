@@ -0,0 +1,60 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with a size bound and a TTL.
+
+    Entries can carry a version tag. get(key, version) treats an entry
+    stored under a different version as a miss, which lets a shared
+    version counter (see src/data_version.py) invalidate entries held
+    by every worker process, not just this one.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, version, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            expires_at, entry_version, value = entry
+            if expires_at < time.monotonic() or (version is not None and entry_version != version):
+                del self._data[key]
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key, value, version=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._data), maxsize=self.maxsize, ttl=self.ttl)
@@ -0,0 +1,60 @@
+from functools import wraps
+from flask import g, request, make_response
+from src.db import get_db
+
+
+def bump_data_version(cur, user_ids):
+    """
+    Marks the users' medication/dose data as changed. Call inside the
+    writing transaction so the new version commits with the data.
+    """
+    user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+    if not user_ids:
+        return
+    cur.execute("""
+        INSERT INTO user_data_versions (user_id, version)
+        VALUES """ + ", ".join(["(%s, 1)"] * len(user_ids)) + """
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, tuple(user_ids))
+
+
+def get_data_version(cur, user_id):
+    cur.execute("SELECT version FROM user_data_versions WHERE user_id = %s", (user_id,))
+    row = cur.fetchone()
+    if row is None:
+        return 0
+    return row["version"] if isinstance(row, dict) else row[0]
+
+
+def make_etag(user_id, version):
+    return f'"u{user_id}-v{version}"'
+
+
+def conditional_get(f):
+    """
+    For GET handlers taking user_id (use under @token_required).
+    Looks up the user's data version first - one primary-key read - and
+    answers If-None-Match with 304 before the handler touches any table.
+    Otherwise runs the handler and tags a 200 response with the ETag.
+    """
+    @wraps(f)
+    def decorated(user_id, *args, **kwargs):
+        conn = get_db()
+        cur = conn.cursor()
+        version = get_data_version(cur, user_id)
+        cur.close()
+        g.data_version = version
+
+        etag = make_etag(user_id, version)
+        if etag.strip('"') in request.if_none_match:
+            response = make_response("", 304)
+        else:
+            response = make_response(f(user_id, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    return decorated
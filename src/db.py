@@ -1,21 +1,254 @@
 import os
+import time
+import threading
+from collections import deque
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
+from flask import g, has_app_context
 from dotenv import load_dotenv
+from .query_stats import InstrumentedCursor
 
 load_dotenv()
 
+# Pool sizing is per process, so with mod_wsgi the total is
+# DB_POOL_SIZE x number of daemon processes.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))      # seconds to wait for a free connection
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))     # seconds before a connection is replaced
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+
+def _connect():
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD", ""),
+        database=os.getenv("DB_NAME", "pillpal_db"),
+        port=os.getenv("DB_PORT", 3306),
+        autocommit=True
+    )
+
+
+class PooledConnection:
+    """
+    Thin proxy around a mysql connection. close() hands the connection
+    back to the pool instead of tearing down the socket. Request-scoped
+    connections ignore close() and are returned on app context teardown.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = time.monotonic()
+        self._request_scoped = False
+        self._checked_out = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._request_scoped:
+            return
+        self._pool.release(self)
+
+
+class ConnectionPool:
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 recycle=POOL_RECYCLE, pre_ping=POOL_PRE_PING):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "opened": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+        }
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+
+                if self._opened < self.size:
+                    self._opened += 1
+                    conn = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolError("Timed out waiting for a database connection")
+
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                self._cond.wait(remaining)
+
+            self._stats["checkouts"] += 1
+
+        # Network work happens outside the lock
+        try:
+            if conn is not None:
+                conn = self._validate(conn)
+            if conn is None:
+                conn = PooledConnection(self, _connect())
+                with self._cond:
+                    self._stats["opened"] += 1
+        except Exception:
+            self._discard()
+            raise
+
+        conn._checked_out = True
+        return conn
+
+    def _validate(self, conn):
+        if time.monotonic() - conn._created_at > self.recycle:
+            with self._cond:
+                self._stats["recycled"] += 1
+            self._close_raw(conn)
+            return None
+
+        if self.pre_ping:
+            try:
+                conn._raw.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._stats["ping_failures"] += 1
+                self._close_raw(conn)
+                return None
+
+        return conn
+
+    def release(self, conn):
+        if not conn._checked_out:
+            return
+        conn._checked_out = False
+        conn._request_scoped = False
+
+        try:
+            if conn._raw.unread_result:
+                conn._raw.consume_results()
+            if conn._raw.in_transaction:
+                conn._raw.rollback()
+            if not conn._raw.autocommit:
+                conn._raw.autocommit = True
+        except Exception:
+            self._close_raw(conn)
+            self._discard()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self):
+        with self._cond:
+            self._opened -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_raw(conn):
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                size=self.size,
+                open=self._opened,
+                idle=len(self._idle),
+                in_use=self._opened - len(self._idle),
+            )
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # mod_wsgi may fork after import, so a pool is only valid in the
+    # process that created it.
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool()
+                _pool_pid = pid
+    return _pool
+
+
 def get_db():
+    """
+    Inside a Flask request: returns the request's connection, checking one
+    out of the pool the first time. Outside a request (scheduler jobs):
+    returns a pooled connection the caller must close().
+    """
     try:
-        conn = mysql.connector.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            user=os.getenv("DB_USER", "root"),
-            password=os.getenv("DB_PASSWORD", ""),
-            database=os.getenv("DB_NAME", "pillpal_db"),
-            port=os.getenv("DB_PORT", 3306),  
-            autocommit=True
-        )
-        return conn
+        if has_app_context():
+            conn = g.get("db_conn")
+            if conn is None:
+                conn = get_pool().acquire()
+                conn._request_scoped = True
+                g.db_conn = conn
+            return conn
+
+        return get_pool().acquire()
     except Error as e:
         print("DB connection error:", e)
         return None
+
+
+def close_db(exc=None):
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        conn._pool.release(conn)
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
+
+
+def insert_many(cur, head, rows, tail="", chunk_size=500):
+    """
+    Multi-row INSERT: runs `head VALUES (...), (...) tail` in chunks of
+    chunk_size rows. Every row must have the same number of columns.
+    Returns the number of rows sent.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+
+    placeholder = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        sql = head + " VALUES " + ", ".join([placeholder] * len(chunk)) + " " + tail
+        cur.execute(sql, tuple(value for row in chunk for value in row))
+
+    return len(rows)
@@ -0,0 +1,192 @@
+import os
+import threading
+import traceback
+from src.db import get_db
+from src.data_version import bump_data_version
+from src.next_dose import refresh_next_dose
+from src.pairings import pairing_resolver
+
+# Rows per DELETE. Every chunk is its own short transaction (the
+# connection is autocommit), so locks on the hot tables are held
+# only for one chunk at a time.
+CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", 5000))
+
+
+# -----------------------------
+# Deletion plans
+# -----------------------------
+# A plan is an ordered list of steps, children before parents:
+#   ("limit", table, sql, params)  - single-table DELETE, repeated with LIMIT
+#   ("ids", table, select_sql, params, key) - ids selected with LIMIT, then deleted by key
+def medication_plan(med_id):
+    return [
+        ("ids", "dose_events", """
+            SELECT de.event_id FROM dose_events de
+            JOIN dose_instances di ON de.instance_id = di.instance_id
+            WHERE di.med_id = %s
+        """, (med_id,), "event_id"),
+        ("limit", "dose_instances", "DELETE FROM dose_instances WHERE med_id = %s", (med_id,)),
+        ("limit", "adherence_daily", "DELETE FROM adherence_daily WHERE med_id = %s", (med_id,)),
+        ("limit", "med_times", """
+            DELETE FROM med_times
+            WHERE rule_id IN (SELECT rule_id FROM med_schedule_rules WHERE med_id = %s)
+        """, (med_id,)),
+        ("limit", "med_schedule_rules", "DELETE FROM med_schedule_rules WHERE med_id = %s", (med_id,)),
+        ("limit", "compartment_assignments", "DELETE FROM compartment_assignments WHERE med_id = %s", (med_id,)),
+        ("limit", "medications", "DELETE FROM medications WHERE med_id = %s", (med_id,)),
+    ]
+
+
+def account_plan(cur, user_id):
+    cur.execute("SELECT med_id FROM medications WHERE user_id = %s", (user_id,))
+    plan = []
+    for (med_id,) in cur.fetchall():
+        plan.extend(medication_plan(med_id))
+
+    for table in ("adherence_daily", "user_next_dose", "notification_settings", "device_pairings",
+                  "user_profiles", "user_data_versions"):
+        plan.append(("limit", table, "DELETE FROM " + table + " WHERE user_id = %s", (user_id,)))
+
+    plan.append(("limit", "users", "DELETE FROM users WHERE user_id = %s", (user_id,)))
+    return plan
+
+
+def run_plan(conn, plan, progress=None, chunk_size=CHUNK_SIZE):
+    """
+    Executes a plan chunk by chunk. progress(table, rows_deleted_total)
+    is called after every chunk. Returns the total rows deleted.
+    """
+    cur = conn.cursor()
+    total = 0
+
+    for step in plan:
+        kind, table = step[0], step[1]
+        while True:
+            if kind == "limit":
+                _, _, sql, params = step
+                cur.execute(sql + " LIMIT %s", (*params, chunk_size))
+                deleted = cur.rowcount
+            else:
+                _, _, select_sql, params, key = step
+                cur.execute(select_sql + " LIMIT %s", (*params, chunk_size))
+                ids = [row[0] for row in cur.fetchall()]
+                deleted = 0
+                if ids:
+                    cur.execute(
+                        "DELETE FROM " + table + " WHERE " + key + " IN (" + ", ".join(["%s"] * len(ids)) + ")",
+                        tuple(ids)
+                    )
+                    deleted = cur.rowcount
+
+            total += deleted
+            if progress and deleted:
+                progress(table, total)
+            if deleted < chunk_size:
+                break
+
+    cur.close()
+    return total
+
+
+def count_medication_rows(cur, med_id):
+    cur.execute("SELECT COUNT(*) FROM dose_instances WHERE med_id = %s", (med_id,))
+    return cur.fetchone()[0]
+
+
+# -----------------------------
+# Background jobs
+# -----------------------------
+def create_job(cur, kind, user_id, target_id):
+    cur.execute("""
+        INSERT INTO deletion_jobs (kind, user_id, target_id, status)
+        VALUES (%s, %s, %s, 'pending')
+    """, (kind, user_id, target_id))
+    return cur.lastrowid
+
+
+def get_job(cur, job_id, user_id):
+    cur.execute("""
+        SELECT job_id, kind, target_id, status, rows_deleted, current_table, error,
+               created_at, updated_at
+        FROM deletion_jobs
+        WHERE job_id = %s AND user_id = %s
+    """, (job_id, user_id))
+    return cur.fetchone()
+
+
+def _update_job(conn, job_id, **fields):
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE deletion_jobs SET " + ", ".join(f"{name} = %s" for name in fields) + " WHERE job_id = %s",
+        (*fields.values(), job_id)
+    )
+    cur.close()
+
+
+def run_job(job_id):
+    conn = get_db()
+    if conn is None:
+        return
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT kind, user_id, target_id FROM deletion_jobs WHERE job_id = %s", (job_id,))
+        kind, user_id, target_id = cur.fetchone()
+
+        plan = account_plan(cur, user_id) if kind == "account" else medication_plan(target_id)
+        cur.close()
+
+        _update_job(conn, job_id, status="running")
+        total = run_plan(
+            conn, plan,
+            progress=lambda table, rows: _update_job(conn, job_id, rows_deleted=rows, current_table=table)
+        )
+
+        if kind == "medication":
+            cur = conn.cursor()
+            bump_data_version(cur, [user_id])
+            refresh_next_dose(cur, [user_id])
+            cur.close()
+        else:
+            pairing_resolver.invalidate()
+
+        _update_job(conn, job_id, status="done", rows_deleted=total, current_table=None)
+        print(f"[DELETION] job {job_id} ({kind}) removed {total} rows")
+
+    except Exception as e:
+        traceback.print_exc()
+        try:
+            _update_job(conn, job_id, status="failed", error=str(e)[:255])
+        except Exception:
+            pass
+    finally:
+        conn.close()
+
+
+def start_job(job_id):
+    threading.Thread(target=run_job, args=(job_id,), name=f"deletion-{job_id}", daemon=True).start()
+
+
+def resume_jobs():
+    """
+    Restarts jobs that stopped making progress (their process died).
+    Re-running a plan is safe: every step only deletes what is left.
+    """
+    conn = get_db()
+    if conn is None:
+        return
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT job_id FROM deletion_jobs
+            WHERE status IN ('pending', 'running')
+              AND updated_at < NOW() - INTERVAL 5 MINUTE
+        """)
+        job_ids = [row[0] for row in cur.fetchall()]
+    finally:
+        cur.close()
+        conn.close()
+
+    for job_id in job_ids:
+        print(f"[DELETION] resuming job {job_id}")
+        start_job(job_id)
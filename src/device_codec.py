@@ -0,0 +1,287 @@
+"""
+Compact encodings for the /api/device/* routes.
+
+Devices choose the response format with Accept:
+
+  application/json                    - default
+  application/cbor                    - CBOR (RFC 8949), same structure as the JSON
+  application/vnd.pillpal.state       - fixed 13-byte struct for poll, wait and
+                                        alert_status; other routes fall back to
+                                        CBOR if accepted, else JSON
+
+Routes keep returning jsonify(...); an after_request hook re-encodes the
+body when the device asked for something else. Request bodies sent as
+application/cbor are read with request_payload().
+
+Only the CBOR subset the backend produces is supported: integers, byte
+and text strings, arrays, maps, booleans, null and floats. Indefinite
+lengths, tags, nesting deeper than MAX_DEPTH and array or map keys are
+rejected with ValueError.
+"""
+import json
+import struct
+from datetime import datetime, timezone
+from flask import request
+
+JSON = "application/json"
+CBOR = "application/cbor"
+STATE = "application/vnd.pillpal.state"
+
+# Every device route lives under this path (device_alert's are mounted
+# with an extra /api prefix, hence "in" rather than startswith).
+DEVICE_PATH = "/api/device/"
+
+# Deepest array/map nesting accepted from a device
+MAX_DEPTH = 16
+
+# flags, version, instance_id, scheduled_at (unix seconds, UTC); 0 = none
+#   flags bit 0 led, 1 sound, 2 vibration, 3 alert active, 4 should_alert
+_STATE = struct.Struct("<BIII")
+FLAG_LED, FLAG_SOUND, FLAG_VIBRATION, FLAG_ALERT, FLAG_SHOULD_ALERT = (1, 2, 4, 8, 16)
+_STATE_KEYS = {"led", "sound", "vibration", "alert", "should_alert",
+               "version", "instance_id", "scheduled_at"}
+
+
+# -----------------------------
+# CBOR
+# -----------------------------
+def _head(major, value):
+    major <<= 5
+    if value < 24:
+        return bytes((major | value,))
+    if value < 0x100:
+        return bytes((major | 24, value))
+    if value < 0x10000:
+        return bytes((major | 25,)) + value.to_bytes(2, "big")
+    if value < 0x100000000:
+        return bytes((major | 26,)) + value.to_bytes(4, "big")
+    return bytes((major | 27,)) + value.to_bytes(8, "big")
+
+
+def _encode(value, out):
+    if value is None:
+        out.append(b"\xf6")
+    elif value is True:
+        out.append(b"\xf5")
+    elif value is False:
+        out.append(b"\xf4")
+    elif isinstance(value, int):
+        out.append(_head(0, value) if value >= 0 else _head(1, -1 - value))
+    elif isinstance(value, float):
+        out.append(b"\xfb" + struct.pack(">d", value))
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        out.append(_head(3, len(data)))
+        out.append(data)
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(_head(2, len(value)))
+        out.append(bytes(value))
+    elif isinstance(value, (list, tuple)):
+        out.append(_head(4, len(value)))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out.append(_head(5, len(value)))
+        for key, item in value.items():
+            _encode(key, out)
+            _encode(item, out)
+    else:
+        raise TypeError(f"cannot CBOR-encode {type(value).__name__}")
+
+
+def cbor_dumps(value):
+    out = []
+    _encode(value, out)
+    return b"".join(out)
+
+
+def _decode(data, pos, depth=0):
+    if depth > MAX_DEPTH:
+        raise ValueError("CBOR nesting too deep")
+    initial = data[pos]
+    major, info = initial >> 5, initial & 0x1F
+    pos += 1
+
+    if major == 7:
+        if info == 20:
+            return False, pos
+        if info == 21:
+            return True, pos
+        if info in (22, 23):
+            return None, pos
+        if info == 25:
+            return struct.unpack_from(">e", data, pos)[0], pos + 2
+        if info == 26:
+            return struct.unpack_from(">f", data, pos)[0], pos + 4
+        if info == 27:
+            return struct.unpack_from(">d", data, pos)[0], pos + 8
+        raise ValueError(f"unsupported CBOR simple value {info}")
+
+    if info < 24:
+        arg = info
+    elif info <= 27:
+        size = 1 << (info - 24)
+        arg = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    else:
+        raise ValueError("indefinite-length CBOR items are not supported")
+
+    if major == 0:
+        return arg, pos
+    if major == 1:
+        return -1 - arg, pos
+    if major in (2, 3):
+        chunk = bytes(data[pos:pos + arg])
+        if len(chunk) != arg:
+            raise ValueError("truncated CBOR string")
+        return (chunk if major == 2 else chunk.decode("utf-8")), pos + arg
+    if major == 4:
+        items = []
+        for _ in range(arg):
+            item, pos = _decode(data, pos, depth + 1)
+            items.append(item)
+        return items, pos
+    if major == 5:
+        items = {}
+        for _ in range(arg):
+            key, pos = _decode(data, pos, depth + 1)
+            if isinstance(key, (list, dict)):
+                raise ValueError("CBOR map keys must be strings, numbers or bytes")
+            items[key], pos = _decode(data, pos, depth + 1)
+        return items, pos
+    raise ValueError("CBOR tags are not supported")
+
+
+def cbor_loads(data):
+    try:
+        value, pos = _decode(data, 0)
+    except (IndexError, struct.error):
+        raise ValueError("truncated CBOR data")
+    if pos != len(data):
+        raise ValueError("trailing bytes after CBOR item")
+    return value
+
+
+# -----------------------------
+# Fixed-layout state
+# -----------------------------
+def _timestamp(value):
+    if not value:
+        return 0
+    # scheduled_at values are naive UTC
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def state_dumps(payload):
+    """
+    Packs a poll / wait / alert_status response into the 13-byte STATE
+    layout. Returns None for anything else (sync responses, errors,
+    receipts), which would lose fields in it.
+    """
+    if not isinstance(payload, dict) or not payload.keys() <= _STATE_KEYS:
+        return None
+    if "alert" not in payload and "should_alert" not in payload:
+        return None
+
+    flags = 0
+    if payload.get("led"):
+        flags |= FLAG_LED
+    if payload.get("sound"):
+        flags |= FLAG_SOUND
+    if payload.get("vibration"):
+        flags |= FLAG_VIBRATION
+    if payload.get("alert"):
+        flags |= FLAG_ALERT
+    if payload.get("should_alert"):
+        flags |= FLAG_SHOULD_ALERT
+
+    return _STATE.pack(
+        flags,
+        (payload.get("version") or 0) & 0xFFFFFFFF,
+        payload.get("instance_id") or 0,
+        _timestamp(payload.get("scheduled_at")),
+    )
+
+
+def state_loads(data):
+    flags, version, instance_id, scheduled_at = _STATE.unpack(data)
+    return {
+        "led": bool(flags & FLAG_LED),
+        "sound": bool(flags & FLAG_SOUND),
+        "vibration": bool(flags & FLAG_VIBRATION),
+        "alert": bool(flags & FLAG_ALERT),
+        "should_alert": bool(flags & FLAG_SHOULD_ALERT),
+        "version": version,
+        "instance_id": instance_id or None,
+        "scheduled_at": scheduled_at or None,
+    }
+
+
+# -----------------------------
+# Flask integration
+# -----------------------------
+def request_payload():
+    """The request body as Python data: CBOR or JSON, None if absent or malformed."""
+    if request.mimetype == CBOR:
+        try:
+            return cbor_loads(request.get_data())
+        except (ValueError, UnicodeDecodeError):
+            return None
+    return request.get_json(silent=True)
+
+
+def request_object():
+    """request_payload() if it is an object (dict), else {}."""
+    data = request_payload()
+    return data if isinstance(data, dict) else {}
+
+
+def positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def parse_id(value):
+    """
+    A device-sent id as a positive int, or None. Digit strings ("7") are
+    accepted too: older JSON firmware sends them and MySQL used to cast
+    them.
+    """
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value.strip())
+    return value if positive_int(value) else None
+
+
+def _negotiate(response):
+    if DEVICE_PATH not in request.path:
+        return response
+
+    response.vary.add("Accept")
+    if response.mimetype != JSON or response.is_streamed or response.status_code in (204, 304):
+        return response
+
+    wanted = request.accept_mimetypes.best_match([JSON, CBOR, STATE], default=JSON)
+    if wanted == JSON:
+        return response
+
+    payload = json.loads(response.get_data())
+    body = None
+    if wanted == STATE:
+        if response.status_code == 200:
+            body = state_dumps(payload)
+        if body is None and request.accept_mimetypes[CBOR]:
+            wanted = CBOR
+    if wanted == CBOR:
+        body = cbor_dumps(payload)
+    if body is None:
+        return response  # not representable in the requested layout
+
+    response.set_data(body)
+    response.mimetype = wanted
+    return response
+
+
+def init_app(app):
+    app.after_request(_negotiate)
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from src.db import get_db, insert_many
+from src.device_codec import parse_id
+
+BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", 10000))
+FLUSH_ROWS = int(os.getenv("EVENT_FLUSH_ROWS", 500))
+FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", 1.0))
+MAX_RETRIES = int(os.getenv("EVENT_MAX_RETRIES", 3))
+
+dead_letter_log = logging.getLogger("pillpal.dead_letter")
+
+
+def is_transient(error):
+    """Connection-level failures: the rows are fine, the database is not."""
+    try:
+        from mysql.connector import errors
+        if isinstance(error, (errors.OperationalError, errors.InterfaceError, errors.PoolError)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, ConnectionError)
+
+
+class EventBuffer:
+    """
+    Bounded in-process buffer drained by one writer thread.
+
+    offer() queues rows all-or-nothing and returns False when they do not
+    fit, so callers can push back (HTTP 429). The writer flushes with
+    write(rows) once FLUSH_ROWS rows are waiting or FLUSH_INTERVAL seconds
+    after the oldest one arrived.
+
+    A failed write keeps its rows at the front of the buffer. Transient
+    (connection) errors are retried until the database is back, with
+    offer() pushing back meanwhile. Any other error is retried
+    max_retries times, then the batch is bisected: good rows are written
+    and each row that still fails on its own goes to the
+    "pillpal.dead_letter" log and on_dead(row, error), so one bad row
+    cannot block the buffer.
+    """
+
+    def __init__(self, write, maxsize=BUFFER_SIZE, flush_rows=FLUSH_ROWS,
+                 flush_interval=FLUSH_INTERVAL, name="event-buffer",
+                 max_retries=MAX_RETRIES, transient=is_transient, on_dead=None):
+        self.write = write
+        self.maxsize = maxsize
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.name = name
+        self.max_retries = max_retries
+        self.transient = transient
+        self.on_dead = on_dead
+        self._failures = 0  # consecutive non-transient failures of the head batch
+        self._rows = deque()
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._writer_pid = None
+        self._stats = {
+            "accepted": 0, "rejected": 0, "flushes": 0, "rows_written": 0,
+            "write_errors": 0, "dead_lettered": 0, "last_flush_ms": None, "max_depth": 0,
+        }
+
+    def offer(self, rows):
+        rows = list(rows)
+        self._ensure_writer()
+
+        with self._cond:
+            if len(self._rows) + len(rows) > self.maxsize:
+                self._stats["rejected"] += len(rows)
+                return False
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            self._stats["accepted"] += len(rows)
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._rows))
+            if len(self._rows) >= self.flush_rows:
+                self._cond.notify()
+        return True
+
+    def _ensure_writer(self):
+        pid = os.getpid()
+        if self._writer_pid == pid:
+            return
+        with self._cond:
+            if self._writer_pid == pid:
+                return
+            self._writer_pid = pid
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+            atexit.register(self.drain)
+
+    def _due(self):
+        if not self._rows:
+            return False
+        return (len(self._rows) >= self.flush_rows
+                or time.monotonic() - self._oldest >= self.flush_interval)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    timeout = None
+                    if self._rows:
+                        timeout = max(0.0, self._oldest + self.flush_interval - time.monotonic())
+                    self._cond.wait(timeout)
+            if not self.flush():
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """Writes up to flush_rows queued rows. Returns False if the write failed."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._cond:
+            batch = [self._rows[i] for i in range(min(self.flush_rows, len(self._rows)))]
+        if not batch:
+            return True
+
+        started = time.perf_counter()
+        try:
+            self.write(batch)
+        except Exception as e:
+            with self._cond:
+                self._stats["write_errors"] += 1
+            print(f"[{self.name}] flush of {len(batch)} rows failed:", e)
+            if self.transient(e):
+                return False
+            self._failures += 1
+            if self._failures < self.max_retries:
+                return False
+            return self._isolate(batch, started)
+
+        self._done(len(batch), len(batch), started)
+        return True
+
+    def _isolate(self, batch, started):
+        """Bisects a failing batch in order; rows failing alone are dead-lettered."""
+        done = {"consumed": 0, "written": 0}
+
+        def write_part(rows):
+            try:
+                self.write(rows)
+            except Exception as e:
+                if self.transient(e):
+                    raise
+                if len(rows) == 1:
+                    self._dead_letter(rows[0], e)
+                    done["consumed"] += 1
+                    return
+                mid = len(rows) // 2
+                write_part(rows[:mid])
+                write_part(rows[mid:])
+                return
+            done["consumed"] += len(rows)
+            done["written"] += len(rows)
+
+        try:
+            write_part(batch)
+        except Exception as e:
+            # The database went away mid-way: keep the rest for the next cycle
+            print(f"[{self.name}] isolating failed batch interrupted:", e)
+            self._done(done["consumed"], done["written"], started)
+            return False
+
+        self._done(done["consumed"], done["written"], started)
+        return True
+
+    def _dead_letter(self, row, error):
+        with self._cond:
+            self._stats["dead_lettered"] += 1
+        dead_letter_log.error(json.dumps({
+            "buffer": self.name, "row": repr(row), "error": str(error)[:500],
+        }))
+        if self.on_dead is not None:
+            try:
+                self.on_dead(row, error)
+            except Exception as e:
+                print(f"[{self.name}] dead-letter hook failed:", e)
+
+    def _done(self, consumed, written, started):
+        """Pops consumed rows from the front and records the flush."""
+        with self._cond:
+            for _ in range(consumed):
+                self._rows.popleft()
+            self._oldest = time.monotonic() if self._rows else None
+            if consumed:
+                self._failures = 0
+            if written:
+                self._stats["flushes"] += 1
+                self._stats["rows_written"] += written
+                self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def drain(self):
+        """Flushes until the buffer is empty or a write fails (used at exit)."""
+        while self._rows:
+            if not self.flush():
+                return False
+        return True
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, depth=len(self._rows), maxsize=self.maxsize)
+
+
+# device_events column limits
+EVENT_TYPE_MAX = 64
+SOURCE_MAX = 32
+
+
+def device_event_row(device_id, event):
+    """
+    Validates one device event. Returns a (device_id, event_type, source)
+    row for write_device_events, or None if it would not fit the table.
+    device_id may be a digit string (see parse_id).
+    """
+    if not isinstance(event, dict):
+        return None
+    event_type = event.get("event_type")
+    source = event.get("source", "device")
+    device_id = parse_id(device_id)
+    if device_id is None:
+        return None
+    if not isinstance(event_type, str) or not 0 < len(event_type) <= EVENT_TYPE_MAX:
+        return None
+    if not isinstance(source, str) or not 0 < len(source) <= SOURCE_MAX:
+        return None
+    return (device_id, event_type, source)
+
+
+def write_device_events(rows):
+    """rows: (device_id, event_type, source) tuples, one multi-row INSERT per chunk."""
+    conn = get_db()
+    if conn is None:
+        raise ConnectionError("no database connection")
+    cur = conn.cursor()
+    try:
+        insert_many(cur, "INSERT INTO device_events (device_id, event_type, source)", rows)
+    finally:
+        cur.close()
+        conn.close()
+
+
+device_event_buffer = EventBuffer(write_device_events, name="device-events")
@@ -0,0 +1,14 @@
+import os
+
+BROKER = os.getenv("MQTT_BROKER", "mqtt://127.0.0.1:1883")
+
+# Commands from the backend to devices. The ingest worker's
+# pillpal/device/# subscription also matches it and skips it.
+COMMAND_TOPIC = os.getenv("MQTT_COMMAND_TOPIC", "pillpal/device/commands")
+
+
+def parse_broker(url=BROKER):
+    """mqtt://host:port -> (host, port)"""
+    url = url.split("://", 1)[-1]
+    host, _, port = url.partition(":")
+    return host, int(port or 1883)
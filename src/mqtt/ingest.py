@@ -0,0 +1,343 @@
+"""
+MQTT ingestion worker: subscribes to pillpal/device/# and turns device
+events into dose_events rows and dose status changes.
+
+    python mqtt_worker.py
+
+Messages are received with QoS 1 and acknowledged to the broker only
+after the transaction holding them commits, so a crash or a failed
+write leads to redelivery (at-least-once). Each applied message's
+idempotency key (the device's "seq", else event + device timestamp) is
+stored in device_messages in the same transaction, and a redelivered
+message with a known key is skipped. Without a key, a status event for
+a dose already in that status is still left alone.
+
+Each message is resolved device -> user (pairing resolver) -> dose:
+the message's instance_id when it has one, otherwise the user's
+not-yet-taken (scheduled or snoozed) dose nearest to the message
+timestamp, scheduled at most EARLY_WINDOW after or LATE_WINDOW before
+it. The buffer's writer thread applies queued messages in batches, one
+transaction per batch. A message that keeps failing on its own is
+dead-lettered by the buffer (logged, then acknowledged).
+"""
+import os
+import re
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from src.db import get_db, insert_many
+from src.adherence import lock_doses, set_dose_status
+from src.data_version import bump_data_version
+from src.next_dose import refresh_next_dose
+from src.pairings import pairing_resolver
+from src.event_buffer import EventBuffer
+from src.scheduler.device_hub import device_hub
+from src.scheduler.dose_queue import utcnow
+from src.mqtt.broker import BROKER, COMMAND_TOPIC, parse_broker
+
+TOPIC = os.getenv("MQTT_INGEST_TOPIC", "pillpal/device/#")
+CLIENT_ID = os.getenv("MQTT_INGEST_CLIENT_ID", "pillpal-ingest")
+BATCH_SIZE = int(os.getenv("MQTT_INGEST_BATCH", 200))
+FLUSH_INTERVAL = float(os.getenv("MQTT_INGEST_FLUSH_INTERVAL", 0.5))
+
+# A pill taken up to this long before its scheduled time still counts for it
+EARLY_WINDOW = timedelta(minutes=int(os.getenv("MQTT_EARLY_MINUTES", 60)))
+# ... and up to this long after it (snoozed and overdue doses)
+LATE_WINDOW = timedelta(minutes=int(os.getenv("MQTT_LATE_MINUTES", 180)))
+
+# device event -> (dose_events.event_type, new dose status or None)
+EVENTS = {
+    "pill_taken": ("ack_taken", "taken"),
+    "ack_taken": ("ack_taken", "taken"),
+    "snooze": ("snooze", "snoozed"),
+    "missed": ("miss", "missed"),
+    "miss": ("miss", "missed"),
+    "alert_started": ("alert_started", None),
+}
+DEFAULT_EVENT = ("alert_started", None)
+
+_DEVICE_IN_TOPIC = re.compile(r"^pillpal/device/([^/]+)")
+
+
+def _device_id(value):
+    # 7, "7", "PILLPAL-007"
+    if isinstance(value, int):
+        return value
+    digits = re.search(r"(\d+)$", str(value or ""))
+    return int(digits.group(1)) if digits else None
+
+
+def _utc(value):
+    # ISO 8601 -> naive UTC, like the DATETIME columns; naive input is UTC
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def decode(topic, payload):
+    """
+    Validates one message. Returns {"device_id", "event", "timestamp",
+    "instance_id", "key"} or raises ValueError. device_id may come from
+    the payload or the topic (pillpal/device/<id>/...); instance_id and
+    key are None when the message does not carry them.
+    """
+    try:
+        data = json.loads(payload)
+    except (TypeError, ValueError):
+        raise ValueError("payload is not JSON")
+    if not isinstance(data, dict):
+        raise ValueError("payload is not an object")
+
+    device_id = _device_id(data.get("device_id"))
+    if device_id is None:
+        match = _DEVICE_IN_TOPIC.match(topic or "")
+        device_id = _device_id(match.group(1)) if match else None
+    if device_id is None:
+        raise ValueError("missing device_id")
+
+    event = data.get("event") or data.get("event_type")
+    if not isinstance(event, str) or not event:
+        raise ValueError("missing event")
+
+    timestamp = data.get("timestamp")
+    if timestamp is not None:
+        try:
+            _utc(timestamp)
+        except ValueError:
+            raise ValueError("bad timestamp")
+
+    instance_id = data.get("instance_id")
+    if instance_id is not None and (isinstance(instance_id, bool)
+                                    or not isinstance(instance_id, int) or instance_id <= 0):
+        raise ValueError("bad instance_id")
+
+    seq = data.get("seq")
+    if seq is not None and (isinstance(seq, bool) or not isinstance(seq, (int, str))):
+        raise ValueError("bad seq")
+    if seq is not None:
+        key = f"seq:{seq}"
+    elif timestamp is not None:
+        key = f"{event}@{timestamp}"
+    else:
+        key = None
+    if key is not None and len(key) > 64:
+        raise ValueError("seq or timestamp too long")
+
+    return {"device_id": device_id, "event": event, "timestamp": timestamp,
+            "instance_id": instance_id, "key": key}
+
+
+def nearest_dose(cur, user_id, at):
+    """The user's scheduled or snoozed dose nearest to at, or None."""
+    cur.execute("""
+        SELECT di.instance_id
+        FROM medications m
+        JOIN dose_instances di ON di.med_id = m.med_id
+        WHERE m.user_id = %s
+          AND di.status IN ('scheduled', 'snoozed')
+          AND di.scheduled_at >= %s
+          AND di.scheduled_at <= %s
+        ORDER BY ABS(TIMESTAMPDIFF(SECOND, di.scheduled_at, %s)), di.instance_id
+        LIMIT 1
+    """, (user_id, at - LATE_WINDOW, at + EARLY_WINDOW, at))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _seen_keys(cur, messages):
+    """(device_id, key) pairs of these messages that were already applied."""
+    pairs = sorted({(m["device_id"], m["key"]) for m in messages if m["key"] is not None})
+    if not pairs:
+        return set()
+    cur.execute(
+        "SELECT device_id, msg_key FROM device_messages WHERE (device_id, msg_key) IN ("
+        + ", ".join(["(%s, %s)"] * len(pairs)) + ")",
+        tuple(value for pair in pairs for value in pair),
+    )
+    return {(device_id, msg_key) for device_id, msg_key in cur.fetchall()}
+
+
+class IngestWorker:
+    """
+    Broker-agnostic core. attach(client) wires a paho-style client
+    (subscribe/ack/on_connect/on_message); tests can instead call
+    submit(topic, payload, ack) directly or attach an in-process fake.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.buffer = EventBuffer(self.apply, flush_rows=batch_size,
+                                  flush_interval=flush_interval, name="mqtt-ingest",
+                                  on_dead=self._dead_letter)
+        self._stats = {"received": 0, "invalid": 0, "unresolved": 0,
+                       "applied": 0, "duplicates": 0}
+
+    # -----------------------------
+    # Broker side
+    # -----------------------------
+    def attach(self, client, topic=TOPIC):
+        def on_connect(client, userdata, flags, reason_code, properties=None):
+            print(f"[MQTT] connected ({reason_code}), subscribing to {topic}")
+            client.subscribe(topic, qos=1)
+
+        def on_message(client, userdata, msg):
+            self.submit(msg.topic, msg.payload, lambda: client.ack(msg.mid, msg.qos))
+
+        client.on_connect = on_connect
+        client.on_message = on_message
+        return client
+
+    def submit(self, topic, payload, ack=None):
+        ack = ack or (lambda: None)
+        if topic == COMMAND_TOPIC:
+            ack()  # our own outbound commands
+            return
+
+        self._stats["received"] += 1
+        try:
+            message = decode(topic, payload)
+        except ValueError as e:
+            # Poison messages are acknowledged so they are not redelivered forever
+            self._stats["invalid"] += 1
+            print(f"[MQTT] dropping message on {topic}: {e}")
+            ack()
+            return
+
+        if not self.buffer.offer([(message, ack)]):
+            # Not acknowledged: the broker redelivers it after reconnecting
+            print(f"[MQTT] buffer full, leaving message from device {message['device_id']} unacked")
+
+    # -----------------------------
+    # Database side
+    # -----------------------------
+    @staticmethod
+    def _dead_letter(row, error):
+        # Logged by the buffer; acknowledged so the broker stops redelivering it
+        _, ack = row
+        ack()
+
+    def apply(self, batch):
+        """Applies a batch in one transaction, then acknowledges it. Raises on failure."""
+        conn = get_db()
+        if conn is None:
+            raise ConnectionError("no database connection")
+
+        now = utcnow()
+        try:
+            conn.start_transaction()
+            cur = conn.cursor()
+
+            seen = _seen_keys(cur, [message for message, _ in batch])
+            resolved = []
+            for message, _ in batch:
+                key = (message["device_id"], message["key"])
+                if key in seen:
+                    self._stats["duplicates"] += 1
+                    continue
+                if message["key"] is not None:
+                    seen.add(key)
+
+                user_id = pairing_resolver.user_for_device(message["device_id"])
+                instance_id = message["instance_id"]
+                if user_id is not None and instance_id is None:
+                    at = _utc(message["timestamp"]) if message["timestamp"] else now
+                    instance_id = nearest_dose(cur, user_id, at)
+                if user_id is None or instance_id is None:
+                    self._stats["unresolved"] += 1
+                    continue
+                resolved.append((message, user_id, instance_id))
+
+            doses = lock_doses(cur, {instance_id for _, _, instance_id in resolved})
+            current = {instance_id: dose[3] for instance_id, dose in doses.items()}
+
+            events = []
+            keys = []
+            by_status = {}
+            taken_users = set()
+            for message, user_id, instance_id in resolved:
+                if instance_id not in doses or doses[instance_id][0] != user_id:
+                    self._stats["unresolved"] += 1  # unknown or another user's dose
+                    continue
+                if message["key"] is not None:
+                    keys.append((message["device_id"], message["key"]))
+                event_type, status = EVENTS.get(message["event"], DEFAULT_EVENT)
+                if status is not None:
+                    if current[instance_id] == status:
+                        self._stats["duplicates"] += 1
+                        continue
+                    current[instance_id] = status
+                    by_status.setdefault(status, {})[instance_id] = doses[instance_id]
+                    if status == "taken":
+                        taken_users.add(user_id)
+                meta = json.dumps({"device_id": message["device_id"],
+                                   "event": message["event"],
+                                   "timestamp": message["timestamp"],
+                                   "key": message["key"]})
+                events.append((instance_id, event_type, "device", meta))
+
+            # A dose moved twice in one batch only keeps its last status
+            for status in list(by_status):
+                for instance_id in list(by_status[status]):
+                    if current[instance_id] != status:
+                        del by_status[status][instance_id]
+            for status, status_doses in by_status.items():
+                set_dose_status(cur, status_doses.keys(), status, doses=status_doses)
+
+            insert_many(cur, "INSERT INTO dose_events (instance_id, event_type, source, meta)", events)
+            insert_many(cur, "INSERT INTO device_messages (device_id, msg_key)", keys)
+
+            changed_users = {doses[i][0] for group in by_status.values() for i in group}
+            bump_data_version(cur, changed_users)
+            refresh_next_dose(cur, changed_users, now)
+
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        self._stats["applied"] += len(events)
+        for user_id in taken_users:
+            for device_id in pairing_resolver.devices_for_user(user_id):
+                device_hub.set_alert(device_id, False)
+        for _, ack in batch:
+            ack()
+
+    def stats(self):
+        return dict(self._stats, buffer=self.buffer.stats())
+
+
+def make_client(client_id=CLIENT_ID):
+    import paho.mqtt.client as mqtt
+
+    # Persistent session + manual acks: unacknowledged messages survive
+    # a worker restart and are redelivered by the broker.
+    return mqtt.Client(
+        mqtt.CallbackAPIVersion.VERSION2,
+        client_id=client_id,
+        clean_session=False,
+        manual_ack=True,
+    )
+
+
+def main():
+    worker = IngestWorker()
+    client = worker.attach(make_client())
+    host, port = parse_broker(BROKER)
+
+    while True:
+        try:
+            client.connect(host, port, keepalive=30)
+            break
+        except OSError as e:
+            print(f"[MQTT] broker {host}:{port} unavailable ({e}), retrying")
+            time.sleep(5)
+
+    # loop_forever reconnects on its own after the first connect
+    client.loop_forever(retry_first_connection=True)
+
+
+if __name__ == "__main__":
+    main()
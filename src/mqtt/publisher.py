@@ -0,0 +1,130 @@
+import os
+import time
+import json
+import queue
+import threading
+from src.mqtt.broker import BROKER, COMMAND_TOPIC, parse_broker
+
+QUEUE_SIZE = int(os.getenv("MQTT_PUBLISH_QUEUE", 1000))
+CLIENT_ID = os.getenv("MQTT_PUBLISH_CLIENT_ID", "")  # "" lets the broker assign one per process
+
+
+class MqttPublisher:
+    """
+    Process-wide MQTT publisher: one long-lived connection, reconnected
+    automatically by paho's network loop, fed from a bounded queue.
+
+    publish() never blocks the caller; it returns False (and counts a
+    drop) when the queue is full. Messages wait in the queue while the
+    broker is unreachable. Latency is measured from publish() to the
+    broker's PUBACK, so only QoS 1/2 messages are timed.
+    """
+
+    def __init__(self, broker=BROKER, maxsize=QUEUE_SIZE, client_id=CLIENT_ID):
+        self.host, self.port = parse_broker(broker)
+        self.client_id = client_id
+        self._queue = queue.Queue(maxsize)
+        self._connected = threading.Event()
+        self._pending = {}  # mid -> enqueued_at
+        self._lock = threading.RLock()  # paho may call on_publish from inside publish()
+        self._pid = None
+        self._stats = {
+            "queued": 0, "published": 0, "dropped": 0, "errors": 0,
+            "disconnects": 0, "last_ms": None, "avg_ms": None, "max_ms": 0.0,
+        }
+
+    def publish(self, topic, payload, qos=1):
+        self._ensure_started()
+        if not isinstance(payload, (str, bytes)):
+            payload = json.dumps(payload, separators=(",", ":"))
+        try:
+            self._queue.put_nowait((topic, payload, qos, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._lock:
+            self._stats["queued"] += 1
+        return True
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            threading.Thread(target=self._run, name="mqtt-publisher", daemon=True).start()
+
+    def _make_client(self):
+        import paho.mqtt.client as mqtt
+
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
+        client.reconnect_delay_set(min_delay=1, max_delay=30)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+        return client
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if not reason_code.is_failure:
+            self._connected.set()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        self._connected.clear()
+        with self._lock:
+            self._stats["disconnects"] += 1
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        with self._lock:
+            enqueued_at = self._pending.pop(mid, None)
+            if enqueued_at is None:
+                return
+            ms = (time.monotonic() - enqueued_at) * 1000
+            stats = self._stats
+            stats["published"] += 1
+            stats["last_ms"] = round(ms, 2)
+            stats["max_ms"] = round(max(stats["max_ms"], ms), 2)
+            avg = stats["avg_ms"]
+            stats["avg_ms"] = round(ms if avg is None else avg * 0.9 + ms * 0.1, 2)
+
+    def _run(self):
+        client = self._make_client()
+        client.connect_async(self.host, self.port, keepalive=60)
+        client.loop_start()
+
+        while True:
+            topic, payload, qos, enqueued_at = self._queue.get()
+            self._connected.wait()
+            try:
+                with self._lock:
+                    # held so a fast PUBACK cannot arrive before the mid is registered
+                    info = client.publish(topic, payload, qos=qos)
+                    if info.rc == 0 and qos > 0:
+                        self._pending[info.mid] = enqueued_at
+                if info.rc != 0:
+                    raise RuntimeError(f"publish rc={info.rc}")
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                print("MQTT publish error:", e)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, depth=self._queue.qsize(),
+                        connected=self._connected.is_set(), in_flight=len(self._pending))
+
+
+def publish_prefs(device_ids, sound, vibration, led):
+    """All three preference flags in one command message."""
+    return publisher.publish(COMMAND_TOPIC, {
+        "command": "SET_PREFS",
+        "device_ids": list(device_ids),
+        "sound": sound,
+        "vibration": vibration,
+        "led": led,
+    })
+
+
+publisher = MqttPublisher()
@@ -0,0 +1,69 @@
+"""
+Next due dose per user (user_next_dose), so /api/device/alert_status is
+a primary-key lookup instead of a sort over the user's dose history.
+
+The "next dose" is the earliest dose still 'scheduled' that is no older
+than GRACE minutes: an overdue dose keeps alerting for that long, after
+which the following dose takes over. refresh_next_dose() recomputes it
+and must be called, in the same transaction, by every path that
+materializes, deletes or changes the status of doses. Devices share
+their paired user's row (see src/pairings.py).
+"""
+import os
+from datetime import timedelta
+from src.scheduler.dose_queue import utcnow
+
+GRACE = timedelta(minutes=int(os.getenv("NEXT_DOSE_GRACE_MINUTES", 60)))
+
+
+def refresh_next_dose(cur, user_ids, now=None):
+    now = now or utcnow()
+    user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+
+    for user_id in user_ids:
+        cur.execute("""
+            SELECT di.instance_id, di.med_id, di.scheduled_at
+            FROM medications m
+            JOIN dose_instances di ON di.med_id = m.med_id
+            WHERE m.user_id = %s
+              AND di.status = 'scheduled'
+              AND di.scheduled_at >= %s
+            ORDER BY di.scheduled_at, di.instance_id
+            LIMIT 1
+        """, (user_id, now - GRACE))
+        row = cur.fetchone()
+        if isinstance(row, dict):
+            row = (row["instance_id"], row["med_id"], row["scheduled_at"])
+        instance_id, med_id, scheduled_at = row or (None, None, None)
+
+        cur.execute("""
+            INSERT INTO user_next_dose (user_id, instance_id, med_id, scheduled_at)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                instance_id = VALUES(instance_id),
+                med_id = VALUES(med_id),
+                scheduled_at = VALUES(scheduled_at)
+        """, (user_id, instance_id, med_id, scheduled_at))
+
+
+def get_next_dose(cur, user_id, now=None):
+    """
+    Returns (instance_id, med_id, scheduled_at); all None when nothing is
+    due. Recomputes only if the row is missing or its dose has aged past
+    the grace period.
+    """
+    now = now or utcnow()
+    cur.execute("""
+        SELECT instance_id, med_id, scheduled_at
+        FROM user_next_dose
+        WHERE user_id = %s
+    """, (user_id,))
+    row = cur.fetchone()
+    if isinstance(row, dict):
+        row = (row["instance_id"], row["med_id"], row["scheduled_at"])
+
+    if row is None or (row[2] is not None and row[2] < now - GRACE):
+        refresh_next_dose(cur, [user_id], now)
+        return get_next_dose(cur, user_id, now)
+
+    return row
@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+from src.db import get_db
+
+# How often a process re-checks device_pairings for changes made elsewhere
+REFRESH_SECONDS = float(os.getenv("PAIRING_REFRESH_SECONDS", 30))
+
+
+class PairingResolver:
+    """
+    In-memory view of the active device pairings:
+    device_id -> user_id and user_id -> device_ids.
+
+    The whole table is loaded in one query. Afterwards, at most every
+    REFRESH_SECONDS, one aggregate query (row count, max pairing_id, max
+    updated_at) tells whether anything changed; only then is the map
+    reloaded. invalidate() forces a reload on the next lookup.
+    If the database is unreachable the last loaded map keeps serving.
+    """
+
+    def __init__(self, refresh_seconds=REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._device_user = {}
+        self._user_devices = {}
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"loads": 0, "checks": 0, "errors": 0}
+
+    def _query(self, sql):
+        conn = get_db()
+        if conn is None:
+            raise RuntimeError("no database connection")
+        cur = conn.cursor()
+        try:
+            cur.execute(sql)
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    def _fetch_fingerprint(self):
+        return tuple(self._query("""
+            SELECT COUNT(*), MAX(pairing_id), MAX(updated_at) FROM device_pairings
+        """)[0])
+
+    def warm(self):
+        fingerprint = self._fetch_fingerprint()
+        rows = self._query("SELECT device_id, user_id FROM device_pairings WHERE active = 1")
+
+        device_user = {}
+        user_devices = {}
+        for device_id, user_id in rows:
+            device_user[device_id] = user_id
+            user_devices.setdefault(user_id, []).append(device_id)
+
+        # Swapped in whole, so readers never see a half-built map
+        self._device_user = device_user
+        self._user_devices = {user_id: tuple(ids) for user_id, ids in user_devices.items()}
+        self._fingerprint = fingerprint
+        self._checked_at = time.monotonic()
+        self._stats["loads"] += 1
+
+    def _refresh(self):
+        if self._fingerprint is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        if not self._lock.acquire(blocking=self._fingerprint is None):
+            return  # another thread is already checking; serve the current map
+
+        try:
+            if self._fingerprint is None:
+                self.warm()
+                return
+            if time.monotonic() - self._checked_at < self.refresh_seconds:
+                return
+            self._stats["checks"] += 1
+            if self._fetch_fingerprint() != self._fingerprint:
+                self.warm()
+            else:
+                self._checked_at = time.monotonic()
+        except Exception as e:
+            self._stats["errors"] += 1
+            self._checked_at = time.monotonic()
+            print("Pairing refresh error:", e)
+        finally:
+            self._lock.release()
+
+    def user_for_device(self, device_id):
+        self._refresh()
+        try:
+            return self._device_user.get(int(device_id))
+        except (TypeError, ValueError):
+            return None
+
+    def devices_for_user(self, user_id):
+        self._refresh()
+        return self._user_devices.get(user_id, ())
+
+    def invalidate(self):
+        self._fingerprint = None
+
+    def stats(self):
+        return dict(self._stats, devices=len(self._device_user), users=len(self._user_devices))
+
+
+pairing_resolver = PairingResolver()
@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from flask import g, request, has_request_context
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG")            # optional file path, stderr otherwise
+SERVER_TIMING = os.getenv("DB_SERVER_TIMING", "0") == "1"
+
+slow_log = logging.getLogger("pillpal.slow_query")
+slow_log.setLevel(logging.INFO)
+if SLOW_QUERY_LOG:
+    slow_log.addHandler(logging.FileHandler(SLOW_QUERY_LOG))
+
+_route_stats = {}
+_route_lock = threading.Lock()
+
+
+def _compact(sql):
+    return re.sub(r"\s+", " ", str(sql)).strip()
+
+
+class InstrumentedCursor:
+    """
+    Wraps a mysql cursor and times every execute()/executemany().
+    Everything else is passed straight through.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._raw.close()
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._raw.execute(operation, params, *args, **kwargs)
+        finally:
+            record_query(operation, time.perf_counter() - start)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._raw.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            record_query(operation, time.perf_counter() - start)
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or request.path
+    return "background"
+
+
+def record_query(sql, elapsed):
+    ms = elapsed * 1000.0
+
+    if has_request_context():
+        stats = g.get("db_stats")
+        if stats is None:
+            stats = g.db_stats = {"queries": 0, "db_ms": 0.0, "slowest_ms": 0.0, "slowest_sql": None}
+        stats["queries"] += 1
+        stats["db_ms"] += ms
+        if ms > stats["slowest_ms"]:
+            stats["slowest_ms"] = ms
+            stats["slowest_sql"] = sql
+
+    if ms >= SLOW_QUERY_MS:
+        slow_log.warning(json.dumps({
+            "type": "slow_query",
+            "endpoint": _endpoint(),
+            "ms": round(ms, 2),
+            "sql": _compact(sql),
+        }))
+
+
+def _finish_request(response):
+    stats = g.pop("db_stats", None)
+    if not stats:
+        return response
+
+    endpoint = _endpoint()
+    with _route_lock:
+        agg = _route_stats.get(endpoint)
+        if agg is None:
+            agg = _route_stats[endpoint] = {
+                "requests": 0, "queries": 0, "db_ms": 0.0,
+                "max_queries": 0, "slowest_ms": 0.0, "slowest_sql": None,
+            }
+        agg["requests"] += 1
+        agg["queries"] += stats["queries"]
+        agg["db_ms"] += stats["db_ms"]
+        agg["max_queries"] = max(agg["max_queries"], stats["queries"])
+        if stats["slowest_ms"] > agg["slowest_ms"]:
+            agg["slowest_ms"] = stats["slowest_ms"]
+            agg["slowest_sql"] = _compact(stats["slowest_sql"])
+
+    if stats["db_ms"] >= SLOW_QUERY_MS:
+        slow_log.warning(json.dumps({
+            "type": "slow_request",
+            "endpoint": endpoint,
+            "queries": stats["queries"],
+            "db_ms": round(stats["db_ms"], 2),
+            "slowest_ms": round(stats["slowest_ms"], 2),
+            "slowest_sql": _compact(stats["slowest_sql"]),
+        }))
+
+    if SERVER_TIMING:
+        response.headers.add(
+            "Server-Timing",
+            'db;dur=%.1f;desc="%d queries"' % (stats["db_ms"], stats["queries"])
+        )
+
+    return response
+
+
+def route_stats():
+    with _route_lock:
+        return {
+            endpoint: dict(agg, db_ms=round(agg["db_ms"], 2), slowest_ms=round(agg["slowest_ms"], 2))
+            for endpoint, agg in _route_stats.items()
+        }
+
+
+def init_app(app):
+    app.after_request(_finish_request)
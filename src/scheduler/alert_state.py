@@ -0,0 +1,178 @@
+import os
+import mmap
+import fcntl
+import struct
+import sqlite3
+import threading
+
+# memory: per-process dict (single process / dev server only)
+# mmap:   shared fixed-size table indexed by device_id, sqlite for anything it can't index
+# sqlite: shared sqlite file
+BACKEND = os.getenv("ALERT_STATE_BACKEND", "mmap")
+STATE_PATH = os.getenv("ALERT_STATE_PATH", "/tmp/pillpal-alert-state")
+SLOTS = int(os.getenv("ALERT_STATE_SLOTS", 65536))
+
+# One slot per device: active flag + change counter. The counter is
+# bumped by set() and by touch() (device settings changed), so it is the
+# device's change version for /api/device/wait.
+_SLOT = struct.Struct("<B3xI")
+
+
+class MemoryAlertStore:
+
+    def __init__(self):
+        self._state = {}  # device_id → (active, version)
+        self._lock = threading.Lock()
+
+    def get(self, device_id):
+        return self._state.get(str(device_id), (False, 0))
+
+    def set(self, device_id, active):
+        with self._lock:
+            _, version = self.get(device_id)
+            self._state[str(device_id)] = (bool(active), version + 1)
+
+    def touch(self, device_id):
+        with self._lock:
+            active, version = self.get(device_id)
+            self._state[str(device_id)] = (active, version + 1)
+
+
+class SqliteAlertStore:
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS alert_state (
+                    device_id TEXT PRIMARY KEY,
+                    active INTEGER NOT NULL,
+                    version INTEGER NOT NULL
+                )
+            """)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, device_id):
+        row = self._conn().execute(
+            "SELECT active, version FROM alert_state WHERE device_id = ?",
+            (str(device_id),)
+        ).fetchone()
+        return (bool(row[0]), row[1]) if row else (False, 0)
+
+    def set(self, device_id, active):
+        self._conn().execute("""
+            INSERT INTO alert_state (device_id, active, version) VALUES (?, ?, 1)
+            ON CONFLICT(device_id) DO UPDATE SET active = excluded.active, version = version + 1
+        """, (str(device_id), int(bool(active))))
+
+    def touch(self, device_id):
+        self._conn().execute("""
+            INSERT INTO alert_state (device_id, active, version) VALUES (?, 0, 1)
+            ON CONFLICT(device_id) DO UPDATE SET version = version + 1
+        """, (str(device_id),))
+
+
+class MmapAlertStore:
+    """
+    Fixed table in a memory-mapped file shared by every worker on the
+    host. Reads are a single unpack at device_id * 8, no locks. Updates
+    read-modify-write the slot under a byte-range lock on it (fcntl.lockf
+    across processes, a thread lock within one), so concurrent set() and
+    touch() calls never lose a version bump. Device ids outside the
+    table go to the sqlite fallback.
+    """
+
+    def __init__(self, path, slots, fallback):
+        self.path = path
+        self.slots = slots
+        self.fallback = fallback
+        self._map = None
+        self._fd = None  # kept open for lockf
+        self._pid = None
+        self._lock = threading.Lock()  # lockf does not exclude threads of one process
+
+    def _table(self):
+        if self._map is None or self._pid != os.getpid():
+            size = self.slots * _SLOT.size
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o660)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            except Exception:
+                os.close(fd)
+                raise
+            self._fd = fd
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+        return self._map
+
+    def _update(self, offset, active=None):
+        """Bumps the slot's version, and sets its flag unless active is None."""
+        table = self._table()
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _SLOT.size, offset)
+            try:
+                current, version = _SLOT.unpack_from(table, offset)
+                if active is not None:
+                    current = int(bool(active))
+                _SLOT.pack_into(table, offset, current, (version + 1) & 0xFFFFFFFF)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _SLOT.size, offset)
+
+    def _offset(self, device_id):
+        try:
+            slot = int(device_id)
+        except (TypeError, ValueError):
+            return None
+        if 0 <= slot < self.slots:
+            return slot * _SLOT.size
+        return None
+
+    def get(self, device_id):
+        offset = self._offset(device_id)
+        if offset is None:
+            return self.fallback.get(device_id)
+        active, version = _SLOT.unpack_from(self._table(), offset)
+        return bool(active), version
+
+    def set(self, device_id, active):
+        offset = self._offset(device_id)
+        if offset is None:
+            return self.fallback.set(device_id, active)
+        self._update(offset, active)
+
+    def touch(self, device_id):
+        offset = self._offset(device_id)
+        if offset is None:
+            return self.fallback.touch(device_id)
+        self._update(offset)
+
+
+def _create_store():
+    if BACKEND == "memory":
+        return MemoryAlertStore()
+
+    sqlite_store = SqliteAlertStore(STATE_PATH + ".sqlite")
+    if BACKEND == "sqlite":
+        return sqlite_store
+
+    store = MmapAlertStore(STATE_PATH + ".mmap", SLOTS, sqlite_store)
+    try:
+        store._table()
+        return store
+    except (OSError, ValueError) as e:
+        print("Alert state mmap unavailable, using sqlite:", e)
+        return sqlite_store
+
+
+alert_store = _create_store()
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from src.scheduler.alert_state import alert_store
+
+# How often the watcher re-reads the shared store for devices that have
+# a waiter in this process (catches writes made by other workers).
+POLL_INTERVAL = float(os.getenv("DEVICE_HUB_POLL_INTERVAL", 0.5))
+
+# Long-polls held at once per process; each ties up a WSGI thread, so
+# this must stay below the serving daemon group's threads=.
+MAX_WAITERS = int(os.getenv("DEVICE_WAIT_MAX_WAITERS", 10))
+
+
+class TooManyWaiters(Exception):
+    pass
+
+
+class DeviceHub:
+    """
+    In-process notification hub for long-polling devices.
+
+    Each device's change version is the counter in the shared alert
+    store, bumped whenever its alert state or settings change. Writers
+    in this process wake waiters immediately through notify(); writes
+    made by other workers (e.g. the scheduler leader) are picked up by a
+    watcher thread that re-reads the store, only for devices that are
+    actually being waited on, every POLL_INTERVAL seconds.
+
+    At most max_waiters requests wait at once; wait() raises
+    TooManyWaiters beyond that instead of taking another thread.
+    """
+
+    def __init__(self, store, poll_interval=POLL_INTERVAL, max_waiters=MAX_WAITERS):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.max_waiters = max_waiters
+        self._lock = threading.Lock()
+        self._waiters = {}  # device_id -> [Condition, waiter count, last seen version]
+        self._waiting = 0
+        self._watcher_pid = None
+        self._stats = {"waits": 0, "wakeups": 0, "timeouts": 0, "rejected": 0}
+
+    def version(self, device_id):
+        return self.store.get(device_id)[1]
+
+    def set_alert(self, device_id, active):
+        self.store.set(device_id, active)
+        self.notify(device_id)
+
+    def touch(self, device_id):
+        self.store.touch(device_id)
+        self.notify(device_id)
+
+    def notify(self, device_id):
+        with self._lock:
+            entry = self._waiters.get(str(device_id))
+            if entry is not None:
+                entry[0].notify_all()
+
+    def wait(self, device_id, since, timeout):
+        """
+        Blocks until the device's version differs from since or timeout
+        seconds pass. Returns the new version, or None on timeout. Raises
+        TooManyWaiters when max_waiters requests are already waiting.
+        """
+        key = str(device_id)
+        deadline = time.monotonic() + timeout
+        self._ensure_watcher()
+
+        with self._lock:
+            if self._waiting >= self.max_waiters:
+                self._stats["rejected"] += 1
+                raise TooManyWaiters()
+            self._waiting += 1
+            self._stats["waits"] += 1
+            entry = self._waiters.get(key)
+            if entry is None:
+                entry = self._waiters[key] = [threading.Condition(self._lock), 0, since]
+            entry[1] += 1
+
+            try:
+                while True:
+                    version = self.version(device_id)
+                    if version != since:
+                        self._stats["wakeups"] += 1
+                        return version
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        return None
+                    entry[0].wait(remaining)
+            finally:
+                self._waiting -= 1
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._waiters[key]
+
+    def _ensure_watcher(self):
+        pid = os.getpid()
+        if self._watcher_pid == pid:
+            return
+        with self._lock:
+            if self._watcher_pid == pid:
+                return
+            self._watcher_pid = pid
+            threading.Thread(target=self._watch, name="device-hub", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                for key, entry in self._waiters.items():
+                    version = self.version(key)
+                    if version != entry[2]:
+                        entry[2] = version
+                        entry[0].notify_all()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, waiting=self._waiting, max_waiters=self.max_waiters)
+
+
+device_hub = DeviceHub(alert_store)
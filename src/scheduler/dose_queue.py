@@ -0,0 +1,320 @@
+import os
+import time
+import heapq
+import threading
+from datetime import datetime, timedelta, timezone
+from src.db import get_db
+
+WINDOW = timedelta(minutes=int(os.getenv("DOSE_QUEUE_WINDOW_MINUTES", 120)))
+# load() also picks up doses that fell due this long ago (startup, reload);
+# check_medications() re-checks their status, so a wider bound is safe
+LOOKBACK = timedelta(seconds=int(os.getenv("DOSE_QUEUE_LOOKBACK_SECONDS", 120)))
+SIGNAL_PATH = os.getenv("DOSE_QUEUE_SIGNAL", "/tmp/pillpal-schedule.signal")
+SIGNAL_CHECK_SECONDS = 5
+
+
+def utcnow():
+    # dose_instances.scheduled_at is stored as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class DoseQueue:
+    """
+    In-memory priority queue of upcoming 'scheduled' doses for the next
+    WINDOW. Loaded with one bulk query, then kept current by:
+      - extend(): pulls doses between the high-water mark and now + WINDOW
+      - reload_medications(): re-reads the doses of edited medications
+      - forget_medication(): drops a deleted medication's doses
+    Stale heap entries are skipped lazily when popped. Popped doses stay
+    in flight until done() (alerts raised) or restore() (put back after a
+    failed attempt, so the next wake retries them).
+    """
+
+    def __init__(self, window=WINDOW, lookback=LOOKBACK):
+        self.window = window
+        self.lookback = lookback
+        self._heap = []            # (scheduled_at, instance_id)
+        self._entries = {}         # instance_id -> (scheduled_at, med_id, user_id)
+        self._in_flight = {}       # popped, not yet done: instance_id -> entry
+        self._load_since = None    # lower bound kept until a load succeeds
+        self._by_med = {}          # med_id -> set(instance_id)
+        self._loaded_until = None  # high-water mark on scheduled_at
+        self._meds_mark = None     # high-water mark on medications.updated_at
+        self._cond = threading.Condition()
+
+    @property
+    def loaded(self):
+        return self._loaded_until is not None
+
+    # -----------------------------
+    # Loading
+    # -----------------------------
+    def _fetch(self, start, end, med_ids=None):
+        sql = """
+            SELECT di.instance_id, di.med_id, di.scheduled_at, m.user_id
+            FROM dose_instances di
+            JOIN medications m ON di.med_id = m.med_id
+            WHERE di.status = 'scheduled'
+              AND di.scheduled_at >= %s
+              AND di.scheduled_at < %s
+        """
+        params = [start, end]
+        if med_ids:
+            sql += " AND di.med_id IN (" + ", ".join(["%s"] * len(med_ids)) + ")"
+            params.extend(med_ids)
+
+        conn = get_db()
+        if conn is None:
+            raise RuntimeError("no database connection")
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(sql, tuple(params))
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+        return {
+            row["instance_id"]: (row["scheduled_at"], row["med_id"], row["user_id"])
+            for row in rows
+        }
+
+    def _fetch_meds_mark(self):
+        conn = get_db()
+        if conn is None:
+            raise RuntimeError("no database connection")
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT MAX(updated_at) FROM medications")
+            return cur.fetchone()[0]
+        finally:
+            cur.close()
+            conn.close()
+
+    def _push(self, instance_id, scheduled_at, med_id, user_id):
+        self._entries[instance_id] = (scheduled_at, med_id, user_id)
+        self._by_med.setdefault(med_id, set()).add(instance_id)
+        heapq.heappush(self._heap, (scheduled_at, instance_id))
+
+    def _drop_med(self, med_id):
+        for instance_id in self._by_med.pop(med_id, ()):
+            self._entries.pop(instance_id, None)
+
+    def load(self, since=None):
+        """
+        (Re)loads the queue from now - lookback, or from since if that is
+        earlier. since is remembered until a load succeeds, so a failed
+        first load retried later still starts where it should have.
+        """
+        now = utcnow()
+        if since is not None:
+            self._load_since = min(since, self._load_since or since)
+        start = now - self.lookback
+        if self._load_since is not None:
+            start = min(start, self._load_since)
+        until = now + self.window
+        mark = self._fetch_meds_mark()
+        doses = self._fetch(start, until)
+
+        with self._cond:
+            self._heap = []
+            self._entries = {}
+            self._by_med = {}
+            for instance_id, (scheduled_at, med_id, user_id) in doses.items():
+                self._push(instance_id, scheduled_at, med_id, user_id)
+            self._loaded_until = until
+            self._meds_mark = mark
+            self._load_since = None
+            self._cond.notify()
+
+        print(f"[SCHEDULER] dose queue loaded {len(doses)} doses until {until}")
+
+    def extend(self):
+        if not self.loaded:
+            return self.load()
+
+        until = utcnow() + self.window
+        start = self._loaded_until
+        if until <= start:
+            return
+
+        doses = self._fetch(start, until)
+        with self._cond:
+            for instance_id, (scheduled_at, med_id, user_id) in doses.items():
+                if instance_id not in self._entries:
+                    self._push(instance_id, scheduled_at, med_id, user_id)
+            self._loaded_until = until
+            self._cond.notify()
+
+    def reload_medications(self, med_ids):
+        if not self.loaded or not med_ids:
+            return
+
+        doses = self._fetch(utcnow(), self._loaded_until, med_ids)
+        with self._cond:
+            for med_id in med_ids:
+                self._drop_med(med_id)
+            for instance_id, (scheduled_at, med_id, user_id) in doses.items():
+                self._push(instance_id, scheduled_at, med_id, user_id)
+            self._cond.notify()
+
+    def forget_medication(self, med_id):
+        with self._cond:
+            self._drop_med(med_id)
+            for instance_id, entry in list(self._in_flight.items()):
+                if entry[1] == med_id:
+                    del self._in_flight[instance_id]
+            self._cond.notify()
+
+    def sync_changed_medications(self):
+        """
+        Picks up medications edited in other processes, using
+        medications.updated_at as a high-water mark.
+        """
+        if not self.loaded or self._meds_mark is None:
+            return self.extend()
+
+        conn = get_db()
+        if conn is None:
+            raise RuntimeError("no database connection")
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT med_id, updated_at FROM medications WHERE updated_at >= %s",
+                        (self._meds_mark,))
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+        if rows:
+            self.reload_medications([med_id for med_id, _ in rows])
+            self._meds_mark = max(updated_at for _, updated_at in rows)
+
+    # -----------------------------
+    # Consuming
+    # -----------------------------
+    def pop_due(self, now=None):
+        """Removes and returns [(instance_id, user_id)] due at or before now."""
+        now = now or utcnow()
+        due = []
+
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                scheduled_at, instance_id = heapq.heappop(self._heap)
+                entry = self._entries.get(instance_id)
+                if entry is None or entry[0] != scheduled_at:
+                    continue  # dropped or re-queued since it was pushed
+                del self._entries[instance_id]
+                self._by_med.get(entry[1], set()).discard(instance_id)
+                self._in_flight[instance_id] = entry
+                due.append((instance_id, entry[2]))
+
+        return due
+
+    def done(self, due):
+        with self._cond:
+            for instance_id, _ in due:
+                self._in_flight.pop(instance_id, None)
+
+    def restore(self, due):
+        """Puts popped doses back, unless reloaded or dropped meanwhile."""
+        with self._cond:
+            for instance_id, _ in due:
+                entry = self._in_flight.pop(instance_id, None)
+                if entry is not None and instance_id not in self._entries:
+                    self._push(instance_id, *entry)
+            self._cond.notify()
+
+    def seconds_until_next(self, now=None):
+        now = now or utcnow()
+        with self._cond:
+            while self._heap:
+                scheduled_at, instance_id = self._heap[0]
+                entry = self._entries.get(instance_id)
+                if entry is not None and entry[0] == scheduled_at:
+                    return max(0.0, (scheduled_at - now).total_seconds())
+                heapq.heappop(self._heap)
+        return None
+
+    def wait(self, timeout):
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._entries),
+                "in_flight": len(self._in_flight),
+                "loaded_until": self._loaded_until.isoformat() if self._loaded_until else None,
+            }
+
+
+dose_queue = DoseQueue()
+
+
+def signal_schedule_change():
+    """Lets the process running the timer know a schedule changed elsewhere."""
+    try:
+        with open(SIGNAL_PATH, "a"):
+            os.utime(SIGNAL_PATH, None)
+    except OSError as e:
+        print("Schedule signal error:", e)
+
+
+def _signal_mtime():
+    try:
+        return os.stat(SIGNAL_PATH).st_mtime
+    except OSError:
+        return None
+
+
+def run_timer(fire):
+    """
+    Sleeps until the next queued dose is due and calls fire(due) with the
+    popped entries; if fire raises they go back in the queue and are
+    retried after SIGNAL_CHECK_SECONDS. Wakes early when the queue
+    changes in this process, and every SIGNAL_CHECK_SECONDS to look for
+    changes from other processes.
+    """
+    seen_signal = _signal_mtime()
+
+    while True:
+        try:
+            if not dose_queue.loaded:
+                dose_queue.load()  # the first load failed; retry it here
+
+            mtime = _signal_mtime()
+            if mtime != seen_signal:
+                seen_signal = mtime
+                dose_queue.sync_changed_medications()
+
+            due = dose_queue.pop_due()
+            if due:
+                try:
+                    fire(due)
+                except Exception:
+                    dose_queue.restore(due)
+                    raise
+                dose_queue.done(due)
+
+            wait = dose_queue.seconds_until_next()
+            if wait is None or wait > SIGNAL_CHECK_SECONDS:
+                wait = SIGNAL_CHECK_SECONDS
+            dose_queue.wait(wait)
+        except Exception as e:
+            print("[SCHEDULER] timer error:", e)
+            time.sleep(SIGNAL_CHECK_SECONDS)
+
+
+def medication_changed(med_id):
+    """Hook for create/update: re-reads the medication's queued doses."""
+    try:
+        dose_queue.reload_medications([med_id])
+    except Exception as e:
+        print("Dose queue reload error:", e)
+    signal_schedule_change()
+
+
+def medication_deleted(med_id):
+    dose_queue.forget_medication(med_id)
+    signal_schedule_change()
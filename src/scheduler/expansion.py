@@ -0,0 +1,99 @@
+import datetime
+
+HORIZON_DAYS = 30  # how far ahead dose_instances are materialized
+
+
+def parse_time(value):
+    """Accepts "HH:MM", "HH:MM:SS", datetime.time or the timedelta MySQL returns for TIME."""
+    if isinstance(value, datetime.time):
+        return value.replace(second=0, microsecond=0, tzinfo=None)
+    if isinstance(value, datetime.timedelta):
+        minutes = int(value.total_seconds()) // 60
+        return datetime.time(minutes // 60, minutes % 60)
+    hour, minute = str(value).split(":")[:2]
+    return datetime.time(int(hour), int(minute))
+
+
+class CompiledSchedule:
+    """
+    A medication schedule rule with everything pre-parsed: times become
+    datetime.time objects, day_mask becomes a set of weekdays and the
+    once/custom bounds become dates. expand() then only does date math.
+
+    repeat_type:
+      daily  - every day
+      weekly - days whose day_mask character (Mon..Sun) is "1"
+      once   - only custom_start
+      custom - every day from custom_start to custom_end inclusive
+    """
+
+    __slots__ = ("repeat_type", "times", "weekdays", "first_day", "last_day")
+
+    def __init__(self, repeat_type, times, day_mask=None, custom_start=None, custom_end=None):
+        self.repeat_type = repeat_type
+        self.times = tuple(parse_time(t) for t in times or ())
+        self.weekdays = frozenset(
+            i for i, flag in enumerate(day_mask or "") if flag == "1"
+        )
+        self.first_day = None
+        self.last_day = None
+
+        if repeat_type == "once" and custom_start:
+            self.first_day = self.last_day = _as_date(custom_start)
+        elif repeat_type == "custom" and custom_start and custom_end:
+            self.first_day = _as_date(custom_start)
+            self.last_day = _as_date(custom_end)
+
+    def matches(self, day):
+        if self.repeat_type == "daily":
+            return True
+        if self.repeat_type == "weekly":
+            return day.weekday() in self.weekdays
+        if self.repeat_type in ("once", "custom"):
+            return self.first_day is not None and self.first_day <= day <= self.last_day
+        return False
+
+    def days(self, start, end):
+        """Matching dates in [start, end)."""
+        if self.repeat_type in ("once", "custom"):
+            if self.first_day is None:
+                return
+            start = max(start, self.first_day)
+            end = min(end, self.last_day + datetime.timedelta(days=1))
+
+        day = start
+        one_day = datetime.timedelta(days=1)
+        while day < end:
+            if self.matches(day):
+                yield day
+            day += one_day
+
+    def expand(self, med_id, start, end):
+        """Lazily yields (med_id, scheduled_at) for every dose in [start, end)."""
+        combine = datetime.datetime.combine
+        times = self.times
+        if not times:
+            return
+        for day in self.days(start, end):
+            for t in times:
+                yield med_id, combine(day, t)
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def horizon(today=None, days=HORIZON_DAYS):
+    """The default materialization window: [today, today + days)."""
+    today = today or datetime.date.today()
+    return today, today + datetime.timedelta(days=days)
+
+
+def expand_many(schedules, start, end):
+    """Yields doses for an iterable of (med_id, CompiledSchedule)."""
+    for med_id, schedule in schedules:
+        yield from schedule.expand(med_id, start, end)
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import fcntl
+import socket
+import threading
+
+LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", "/tmp/pillpal-scheduler.lock")
+RETRY_SECONDS = float(os.getenv("SCHEDULER_LEADER_RETRY", 2))
+RENEW_SECONDS = float(os.getenv("SCHEDULER_LEASE_RENEW", 10))
+
+
+class LeaderLease:
+    """
+    Host-wide leader election on an flock()ed file. The kernel drops the
+    lock when the leader process dies, so a follower polling every
+    RETRY_SECONDS takes over within seconds. The leader rewrites the file
+    with its identity and a renewal timestamp so anyone can report who
+    leads and how fresh the lease is.
+    """
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+        self._fd = None
+        self._acquired_at = None
+
+    @property
+    def is_leader(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        if self.is_leader:
+            return True
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o660)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        self._fd = fd
+        self._acquired_at = time.time()
+        self.renew()
+        return True
+
+    def renew(self):
+        if not self.is_leader:
+            return
+        record = json.dumps({
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "acquired_at": self._acquired_at,
+            "renewed_at": time.time(),
+        }).encode()
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, record, 0)
+
+    def info(self):
+        try:
+            with open(self.path) as f:
+                record = json.loads(f.read() or "{}")
+        except (OSError, ValueError):
+            record = {}
+
+        renewed_at = record.get("renewed_at")
+        return {
+            "leader_pid": record.get("pid"),
+            "leader_host": record.get("host"),
+            "is_leader": self.is_leader,
+            "lease_age_seconds": round(time.time() - renewed_at, 1) if renewed_at else None,
+        }
+
+
+lease = LeaderLease()
+
+
+def run_when_leader(start):
+    """
+    Calls start() once this process wins the lease, then keeps renewing
+    it. Runs in a daemon thread so followers just keep polling.
+    """
+    def loop():
+        while not lease.try_acquire():
+            time.sleep(RETRY_SECONDS)
+
+        print(f"[SCHEDULER] pid {os.getpid()} is scheduler leader")
+        start()
+
+        while True:
+            time.sleep(RENEW_SECONDS)
+            try:
+                lease.renew()
+            except OSError as e:
+                print("[SCHEDULER] lease renew error:", e)
+
+    threading.Thread(target=loop, name="scheduler-leader", daemon=True).start()
+
+
+def leader_info():
+    return lease.info()
@@ -1,54 +1,93 @@
+import os
+import datetime
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timezone
 from src.db import get_db
+from src.scheduler.dose_queue import dose_queue, run_timer, utcnow
+from src.scheduler.alert_state import alert_store
+from src.scheduler.device_hub import device_hub
+from src.scheduler.leader import run_when_leader
+from src.pairings import pairing_resolver
+from src.deletion import resume_jobs
 
-device_alert_state = {}  # device_id → True/False
+REFRESH_MINUTES = int(os.getenv("DOSE_QUEUE_REFRESH_MINUTES", 10))
 
 
-def check_medications():
+def check_medications(due):
     """
-    Runs every minute. Checks if a scheduled dose matches the current time.
-    If yes → sets device_alert_state[device_id] = True
+    Called by the dose timer the moment queued doses fall due.
+    Re-checks that they are still 'scheduled' (one query per batch of due
+    doses, not per tick), then raises the alert for each paired device
+    in the shared alert store, waking any long-polling devices.
     """
-    now_dt = datetime.now(timezone.utc)
-    now_date = now_dt.date().isoformat()
-    now_time = now_dt.strftime("%H:%M")
+    instance_ids = [instance_id for instance_id, _ in due]
 
     conn = get_db()
-    cur = conn.cursor(dictionary=True)
-
-    cur.execute("""
-        SELECT di.instance_id, di.med_id, di.scheduled_at, di.status,
-               m.user_id,
-               dp.device_id
-        FROM dose_instances di
-        JOIN medications m ON di.med_id = m.med_id
-        JOIN device_pairings dp ON dp.user_id = m.user_id AND dp.active = 1
-        WHERE di.status = 'scheduled'
-          AND DATE(di.scheduled_at) = %s
-          AND TIME_FORMAT(di.scheduled_at, '%%H:%%i') = %s
-    """, (now_date, now_time))
-
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    for row in rows:
-        device_id = row["device_id"]
-        print(f"[SCHEDULER] Triggering alert for device {device_id}")
-        device_alert_state[str(device_id)] = True
+    if conn is None:
+        raise RuntimeError("no database connection")
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT instance_id
+            FROM dose_instances
+            WHERE status = 'scheduled'
+              AND instance_id IN (""" + ", ".join(["%s"] * len(instance_ids)) + """)
+        """, tuple(instance_ids))
+        still_due = {row[0] for row in cur.fetchall()}
+    finally:
+        cur.close()
+        conn.close()
+
+    for instance_id, user_id in due:
+        if instance_id not in still_due:
+            continue
+        for device_id in pairing_resolver.devices_for_user(user_id):
+            print(f"[SCHEDULER] Triggering alert for device {device_id}")
+            device_hub.set_alert(device_id, True)
+
+
+def refresh_dose_queue():
+    """Slides the in-memory window forward."""
+    dose_queue.extend()
 
 
 def get_alert_state(device_id):
-    return device_alert_state.get(str(device_id), False)
+    active, _ = alert_store.get(device_id)
+    return active
 
 
 def clear_alert(device_id):
-    device_alert_state[str(device_id)] = False
+    device_hub.set_alert(device_id, False)
 
 
-def start_scheduler():
+def _start_jobs():
+    # Doses due while no process led (failover gap) or popped by a dead
+    # leader before it raised their alerts are still picked up: the first
+    # load starts dose_queue.lookback before the takeover, even if it has
+    # to be retried.
+    since = utcnow() - dose_queue.lookback
+    try:
+        dose_queue.load(since)
+    except Exception as e:
+        # the dose timer retries the load, from the same point
+        print("[SCHEDULER] initial dose load failed:", e)
+
+    timer = threading.Thread(target=run_timer, args=(check_medications,),
+                             name="dose-timer", daemon=True)
+    timer.start()
+
     scheduler = BackgroundScheduler()
-    scheduler.add_job(check_medications, "interval", minutes=1)
+    scheduler.add_job(refresh_dose_queue, "interval", minutes=REFRESH_MINUTES)
+    # Deletion jobs whose worker died are picked up again here
+    scheduler.add_job(resume_jobs, "interval", minutes=REFRESH_MINUTES,
+                      next_run_time=datetime.datetime.now())
     scheduler.start()
     print("[SCHEDULER] started.")
+
+
+def start_scheduler():
+    """
+    Every worker process calls this; only the process holding the
+    scheduler lease actually runs the dose timer and refresh job.
+    """
+    run_when_leader(_start_jobs)
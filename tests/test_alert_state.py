@@ -0,0 +1,39 @@
+import multiprocessing
+import threading
+from src.scheduler.alert_state import MemoryAlertStore, MmapAlertStore
+
+BUMPS = 2000
+
+
+def bump(store, device_id):
+    for i in range(BUMPS):
+        if i % 2:
+            store.touch(device_id)
+        else:
+            store.set(device_id, i % 4 == 0)
+
+
+def test_mmap_set_and_touch(tmp_path):
+    store = MmapAlertStore(str(tmp_path / "alerts.mmap"), 16, MemoryAlertStore())
+    assert store.get(3) == (False, 0)
+    store.set(3, True)
+    store.touch(3)
+    assert store.get(3) == (True, 2)
+    store.touch(99)  # outside the table: fallback
+    assert store.get(99) == (False, 1)
+
+
+def test_mmap_version_bumps_are_not_lost(tmp_path):
+    store = MmapAlertStore(str(tmp_path / "alerts.mmap"), 16, MemoryAlertStore())
+    store._table()
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=bump, args=(store, 5)) for _ in range(4)]
+    threads = [threading.Thread(target=bump, args=(store, 5)) for _ in range(2)]
+    for worker in processes + threads:
+        worker.start()
+    for worker in processes + threads:
+        worker.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    assert store.get(5)[1] == BUMPS * 6
@@ -0,0 +1,22 @@
+import pytest
+from src.api.medications import parse_client_ts
+
+
+def test_numbers_and_iso_strings_compare_as_instants():
+    assert parse_client_ts(1700000000) == 1700000000
+    assert parse_client_ts(1700000000500) == 1700000000.5
+    assert parse_client_ts("2023-11-14T22:13:20Z") == 1700000000
+    assert parse_client_ts("2023-11-14T23:13:20+01:00") == 1700000000
+    assert parse_client_ts("2023-11-14T22:13:20") == 1700000000
+    # "9:00" after "10:00" as strings, but earlier as times
+    assert parse_client_ts("2023-11-14T09:00:00Z") < parse_client_ts("2023-11-14T10:00:00+00:00")
+
+
+def test_missing_sorts_first():
+    assert parse_client_ts(None) < parse_client_ts(0)
+
+
+@pytest.mark.parametrize("value", ["yesterday", "", True, float("nan"), [1], {"t": 1}])
+def test_unparseable(value):
+    with pytest.raises(ValueError):
+        parse_client_ts(value)
@@ -0,0 +1,63 @@
+import pytest
+from flask import Flask
+from src.device_codec import CBOR, MAX_DEPTH, cbor_dumps, cbor_loads, state_dumps, state_loads
+from src.api import device_ack
+from src.api.device_ack import ack_bp
+
+
+def test_cbor_round_trip():
+    value = {"device_id": 7, "events": [{"event_type": "open", "n": -3, "x": 1.5}],
+             "ok": True, "none": None, "raw": b"\x00\x01"}
+    assert cbor_loads(cbor_dumps(value)) == value
+
+
+def test_state_round_trip():
+    data = state_dumps({"should_alert": True, "instance_id": 42,
+                        "scheduled_at": "2025-11-07T08:00:00", "led": True})
+    assert len(data) == 13
+    state = state_loads(data)
+    assert state["should_alert"] and state["led"] and not state["sound"]
+    assert state["instance_id"] == 42
+
+
+@pytest.mark.parametrize("data", [
+    b"\x81" * (MAX_DEPTH + 2) + b"\x00",  # nested arrays
+    b"\xa1\x80\x00",                      # {[]: 0}
+    b"\xa1\xa0\x00",                      # {{}: 0}
+    b"\x82\x00",                          # truncated array
+    b"\x00\x00",                          # trailing bytes
+    b"\x9f\xff",                          # indefinite length
+])
+def test_cbor_rejects_bad_input(data):
+    with pytest.raises(ValueError):
+        cbor_loads(data)
+
+
+def test_nesting_up_to_limit_is_accepted():
+    value = 0
+    for _ in range(MAX_DEPTH):
+        value = [value]
+    assert cbor_loads(cbor_dumps(value)) == value
+
+
+@pytest.mark.parametrize("body", [
+    b"\x81" * 5000 + b"\x00",
+    b"\xa1\x80\x00",
+    cbor_dumps([7]),
+    cbor_dumps({"device_id": "seven"}),
+])
+def test_bad_device_input_is_400(body):
+    app = Flask(__name__)
+    app.register_blueprint(ack_bp)
+    response = app.test_client().post("/api/device/ack", data=body, content_type=CBOR)
+    assert response.status_code == 400
+
+
+def test_digit_string_device_id_is_accepted(monkeypatch):
+    cleared = []
+    monkeypatch.setattr(device_ack, "clear_alert", cleared.append)
+    app = Flask(__name__)
+    app.register_blueprint(ack_bp)
+    response = app.test_client().post("/api/device/ack", json={"device_id": "7"})
+    assert response.status_code == 200
+    assert cleared == [7]
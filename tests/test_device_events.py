@@ -0,0 +1,38 @@
+import pytest
+from flask import Flask
+from src.api import device_events
+from src.api.device_events import device_events_bp
+from src.event_buffer import device_event_row
+
+
+@pytest.mark.parametrize("device_id, expected", [
+    (7, 7), ("7", 7), (" 12 ", 12),
+    (0, None), (-3, None), (True, None), ("7a", None), ("", None), (None, None), (7.0, None),
+])
+def test_device_id(device_id, expected):
+    row = device_event_row(device_id, {"event_type": "opened"})
+    assert (row[0] if row else None) == expected
+
+
+def test_column_limits():
+    assert device_event_row(7, {"event_type": "x" * 64, "source": "y" * 32}) == (7, "x" * 64, "y" * 32)
+    assert device_event_row(7, {"event_type": "x" * 65}) is None
+    assert device_event_row(7, {"event_type": "opened", "source": "y" * 33}) is None
+    assert device_event_row(7, {"event_type": 5}) is None
+    assert device_event_row(7, {}) is None
+
+
+def test_endpoint_queues_rows(monkeypatch):
+    queued = []
+    monkeypatch.setattr(device_events.device_event_buffer, "offer",
+                        lambda rows: queued.extend(rows) or True)
+    app = Flask(__name__)
+    app.register_blueprint(device_events_bp)
+    client = app.test_client()
+
+    response = client.post("/api/device/event", json={"device_id": "7", "event_type": "opened"})
+    assert response.status_code == 202
+    assert queued == [(7, "opened", "device")]
+
+    response = client.post("/api/device/event", json=[{"device_id": "x", "event_type": "opened"}])
+    assert response.status_code == 400
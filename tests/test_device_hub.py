@@ -0,0 +1,32 @@
+import threading
+import time
+import pytest
+from src.scheduler.alert_state import MemoryAlertStore
+from src.scheduler.device_hub import DeviceHub, TooManyWaiters
+
+
+def test_waiter_is_woken_by_alert():
+    hub = DeviceHub(MemoryAlertStore(), poll_interval=0.05)
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(hub.wait(7, 0, 5)))
+    waiter.start()
+    time.sleep(0.05)
+    hub.set_alert(7, True)
+    waiter.join(2)
+    assert result == [1]
+
+
+def test_waiters_over_the_cap_are_rejected_at_once():
+    hub = DeviceHub(MemoryAlertStore(), poll_interval=0.05, max_waiters=1)
+    waiter = threading.Thread(target=hub.wait, args=(7, 0, 0.5))
+    waiter.start()
+    time.sleep(0.05)
+
+    with pytest.raises(TooManyWaiters):
+        hub.wait(8, 0, 5)
+    stats = hub.stats()
+    assert stats["waiting"] == 1 and stats["max_waiters"] == 1 and stats["rejected"] == 1
+
+    waiter.join(2)
+    assert hub.wait(8, 0, 0) is None
+    assert hub.stats()["waiting"] == 0
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from src.scheduler import dose_queue as dose_queue_module
+from src.scheduler.dose_queue import DoseQueue
+
+NOW = datetime(2025, 3, 3, 8, 0)
+
+
+def loaded_queue(monkeypatch, doses, lookback=timedelta(minutes=2)):
+    queue = DoseQueue(lookback=lookback)
+    calls = []
+
+    def fetch(start, end, med_ids=None):
+        calls.append((start, end))
+        return {i: entry for i, entry in doses.items() if start <= entry[0] < end}
+
+    monkeypatch.setattr(dose_queue_module, "utcnow", lambda: NOW)
+    monkeypatch.setattr(queue, "_fetch", fetch)
+    monkeypatch.setattr(queue, "_fetch_meds_mark", lambda: None)
+    queue.load()
+    return queue, calls
+
+
+def test_load_includes_doses_that_just_fell_due(monkeypatch):
+    queue, calls = loaded_queue(monkeypatch, {
+        1: (NOW - timedelta(seconds=30), 10, 100),
+        2: (NOW - timedelta(minutes=10), 10, 100),
+        3: (NOW + timedelta(minutes=5), 11, 100),
+    })
+    assert calls[0][0] == NOW - timedelta(minutes=2)
+    assert queue.pop_due(NOW) == [(1, 100)]
+
+
+def test_failed_fire_is_retried(monkeypatch):
+    queue, _ = loaded_queue(monkeypatch, {1: (NOW, 10, 100), 2: (NOW, 11, 200)})
+
+    due = queue.pop_due(NOW)
+    assert sorted(due) == [(1, 100), (2, 200)]
+    assert queue.stats()["in_flight"] == 2
+
+    queue.restore(due)  # fire raised
+    assert sorted(queue.pop_due(NOW)) == [(1, 100), (2, 200)]
+
+    queue.done(due)  # fire succeeded
+    assert queue.pop_due(NOW) == []
+    assert queue.stats()["pending"] == 0 and queue.stats()["in_flight"] == 0
+
+
+def test_deleted_medication_is_not_restored(monkeypatch):
+    queue, _ = loaded_queue(monkeypatch, {1: (NOW, 10, 100)})
+    due = queue.pop_due(NOW)
+    queue.forget_medication(10)
+    queue.restore(due)
+    assert queue.pop_due(NOW) == []
+
+
+def test_failed_first_load_keeps_its_start(monkeypatch):
+    queue, calls = loaded_queue(monkeypatch, {})
+    takeover = NOW - timedelta(minutes=2)
+
+    monkeypatch.setattr(queue, "_fetch_meds_mark", lambda: 1 / 0)
+    try:
+        queue.load(since=takeover)
+    except ZeroDivisionError:
+        pass
+
+    later = NOW + timedelta(minutes=1)
+    monkeypatch.setattr(dose_queue_module, "utcnow", lambda: later)
+    monkeypatch.setattr(queue, "_fetch_meds_mark", lambda: None)
+    queue.load()
+    assert calls[-1][0] == takeover
+
+    queue.load()
+    assert calls[-1][0] == later - timedelta(minutes=2)
@@ -0,0 +1,81 @@
+import types
+from datetime import date, datetime, time, timedelta
+from src.scheduler.expansion import CompiledSchedule, expand_many, horizon, parse_time
+
+# 2025-03-03 is a Monday
+MONDAY = date(2025, 3, 3)
+
+
+def scheduled(schedule, start=MONDAY, end=MONDAY + timedelta(days=7), med_id=1):
+    return [at for _, at in schedule.expand(med_id, start, end)]
+
+
+def test_parse_time_formats():
+    assert parse_time("08:30") == time(8, 30)
+    assert parse_time("08:30:45") == time(8, 30)
+    assert parse_time(timedelta(hours=21, minutes=5, seconds=59)) == time(21, 5)
+    assert parse_time(time(7, 15, 30)) == time(7, 15)
+
+
+def test_daily():
+    doses = scheduled(CompiledSchedule("daily", ["08:00", "20:00"]), end=MONDAY + timedelta(days=2))
+    assert doses == [
+        datetime(2025, 3, 3, 8), datetime(2025, 3, 3, 20),
+        datetime(2025, 3, 4, 8), datetime(2025, 3, 4, 20),
+    ]
+
+
+def test_weekly_mask():
+    # Mon, Wed, Sun
+    doses = scheduled(CompiledSchedule("weekly", ["09:00"], day_mask="1010001"))
+    assert [at.date() for at in doses] == [MONDAY, MONDAY + timedelta(days=2), MONDAY + timedelta(days=6)]
+    assert scheduled(CompiledSchedule("weekly", ["09:00"], day_mask="0000000")) == []
+    assert scheduled(CompiledSchedule("weekly", ["09:00"])) == []
+
+
+def test_once():
+    schedule = CompiledSchedule("once", ["10:00"], custom_start="2025-03-05")
+    assert scheduled(schedule) == [datetime(2025, 3, 5, 10)]
+    assert scheduled(schedule, start=MONDAY + timedelta(days=3)) == []
+    assert scheduled(CompiledSchedule("once", ["10:00"])) == []
+
+
+def test_custom_bounds_clipped_to_window():
+    schedule = CompiledSchedule("custom", ["12:00"], custom_start="2025-02-20",
+                                custom_end=datetime(2025, 3, 4, 23, 0))
+    assert scheduled(schedule) == [datetime(2025, 3, 3, 12), datetime(2025, 3, 4, 12)]
+
+    schedule = CompiledSchedule("custom", ["12:00"], custom_start=date(2025, 3, 8),
+                                custom_end=date(2025, 3, 20))
+    assert scheduled(schedule) == [datetime(2025, 3, 8, 12), datetime(2025, 3, 9, 12)]
+
+    # No end date: nothing is materialized
+    assert scheduled(CompiledSchedule("custom", ["12:00"], custom_start="2025-03-03")) == []
+
+
+def test_empty_times():
+    assert scheduled(CompiledSchedule("daily", [])) == []
+    assert scheduled(CompiledSchedule("daily", None)) == []
+
+
+def test_unknown_repeat_type():
+    assert scheduled(CompiledSchedule("hourly", ["08:00"])) == []
+
+
+def test_expansion_is_lazy():
+    doses = CompiledSchedule("daily", ["08:00"]).expand(7, MONDAY, date(9999, 1, 1))
+    assert isinstance(doses, types.GeneratorType)
+    assert next(doses) == (7, datetime(2025, 3, 3, 8))
+    assert next(doses) == (7, datetime(2025, 3, 4, 8))
+
+
+def test_expand_many_and_horizon():
+    start, end = horizon(today=MONDAY, days=1)
+    assert (start, end) == (MONDAY, MONDAY + timedelta(days=1))
+
+    doses = list(expand_many([
+        (1, CompiledSchedule("daily", ["08:00"])),
+        (2, CompiledSchedule("weekly", ["09:00"], day_mask="0100000")),
+        (3, CompiledSchedule("once", ["10:00"], custom_start=MONDAY)),
+    ], start, end))
+    assert doses == [(1, datetime(2025, 3, 3, 8)), (3, datetime(2025, 3, 3, 10))]
@@ -0,0 +1,71 @@
+"""
+The scheduler's due-dose query must use idx_dose_status_time
+(migrations/001_dose_lookup_indexes.sql) instead of scanning
+dose_instances. Needs a database with the schema; skipped without one.
+"""
+import os
+import pytest
+from datetime import timedelta
+from src.scheduler import dose_queue
+from src.scheduler.dose_queue import DoseQueue, utcnow
+
+
+class CapturingCursor:
+    def __init__(self, queries):
+        self.queries = queries
+
+    def execute(self, sql, params=None):
+        self.queries.append((sql, params))
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class CapturingConnection:
+    def __init__(self):
+        self.queries = []
+
+    def cursor(self, *args, **kwargs):
+        return CapturingCursor(self.queries)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db():
+    if not (os.getenv("DB_HOST") or os.getenv("DB_NAME")):
+        pytest.skip("no database configured (DB_HOST / DB_NAME)")
+    from src.db import get_db
+    conn = get_db()
+    if conn is None:
+        pytest.skip("database not reachable")
+    yield conn
+    conn.close()
+
+
+def due_dose_query(monkeypatch):
+    captured = CapturingConnection()
+    monkeypatch.setattr(dose_queue, "get_db", lambda: captured)
+    now = utcnow()
+    DoseQueue()._fetch(now, now + timedelta(hours=2))
+    assert len(captured.queries) == 1
+    return captured.queries[0]
+
+
+def test_due_dose_query_uses_status_time_index(db, monkeypatch):
+    sql, params = due_dose_query(monkeypatch)
+
+    cur = db.cursor(dictionary=True)
+    try:
+        cur.execute("EXPLAIN " + sql, params)
+        plan = {row["table"]: row for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+    dose_row = plan["di"]
+    assert dose_row["key"] == "idx_dose_status_time"
+    assert dose_row["type"] != "ALL"
@@ -0,0 +1,15 @@
+import jwt
+import pytest
+from flask import Flask
+from src.api.medications import med_bp, JWT_SECRET
+
+
+@pytest.mark.parametrize("limit", ["abc", "0", "-1", "1.5", ""])
+def test_invalid_limit_is_400(limit):
+    app = Flask(__name__)
+    app.register_blueprint(med_bp)
+    token = jwt.encode({"user_id": 1}, JWT_SECRET, algorithm="HS256")
+
+    response = app.test_client().get(f"/api/medications/history?limit={limit}",
+                                     headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
@@ -0,0 +1,105 @@
+"""
+GET /api/medications must run the same number of queries however many
+medications the user has (no per-medication queries). Runs against a
+fake connection; no database needed.
+"""
+import jwt
+import pytest
+from flask import Flask, g
+from src import db
+from src.api.medications import med_bp, med_cache, JWT_SECRET
+
+
+def medication_rows(count):
+    rows = []
+    for med_id in range(1, count + 1):
+        for hhmm in ("08:00:00", "20:00:00"):
+            rows.append({
+                "med_id": med_id, "name": f"Med {med_id}", "notes": None,
+                "active_start_date": None, "active_end_date": None,
+                "rule_id": med_id, "repeat_type": "daily", "day_mask": None,
+                "lead_minutes": 0, "hhmm": hhmm,
+            })
+    return rows
+
+
+class FakeCursor:
+    def __init__(self, meds, dictionary):
+        self.meds = meds
+        self.dictionary = dictionary
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if "user_data_versions" in sql:
+            self.rows = [{"version": 1} if self.dictionary else (1,)]
+        elif "FROM medications m" in sql:
+            self.rows = medication_rows(self.meds[params[0]])
+        else:
+            raise AssertionError(f"unexpected query: {sql}")
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeRaw:
+    def __init__(self, meds):
+        self.meds = meds
+
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(self.meds, dictionary)
+
+
+class FakePool:
+    def __init__(self, meds):
+        self.meds = meds
+
+    def acquire(self):
+        conn = db.PooledConnection(self, FakeRaw(self.meds))
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        conn._checked_out = False
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(db, "get_pool", lambda: FakePool({1: 1, 2: 15}))
+    med_cache.clear()
+
+    app = Flask(__name__)
+    db.init_app(app)
+    app.register_blueprint(med_bp)
+
+    counts = {}
+
+    @app.after_request
+    def capture(response):
+        counts["queries"] = g.get("db_stats", {}).get("queries", 0)
+        return response
+
+    app.query_counts = counts
+    yield app.test_client()
+    med_cache.clear()
+
+
+def query_count(client, user_id):
+    token = jwt.encode({"user_id": user_id}, JWT_SECRET, algorithm="HS256")
+    response = client.get("/api/medications", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return len(response.get_json()), client.application.query_counts["queries"]
+
+
+def test_query_count_does_not_grow_with_medications(client):
+    few, few_queries = query_count(client, 1)
+    many, many_queries = query_count(client, 2)
+
+    assert (few, many) == (1, 15)
+    assert few_queries > 0
+    assert few_queries == many_queries
@@ -0,0 +1,164 @@
+"""
+Drives IngestWorker.submit() the way the broker callback does, against a
+fake connection; no broker or database needed.
+"""
+import json
+import pytest
+from datetime import date
+from src import db
+from src.mqtt import ingest
+from src.mqtt.ingest import IngestWorker
+
+USER_ID, DEVICE_ID, INSTANCE_ID = 1, 7, 42
+
+
+class FakeDatabase:
+    """Committed state plus the writes of the open transaction."""
+
+    def __init__(self):
+        self.status = {INSTANCE_ID: "scheduled"}
+        self.keys = set()
+        self.events = []
+        self.fail_commit = False
+        self.commits = 0
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        state, pending = self.conn.db, self.conn.pending
+        self.rows = []
+        if sql.lstrip().startswith("SELECT device_id, msg_key FROM device_messages"):
+            pairs = set(zip(params[::2], params[1::2]))
+            self.rows = sorted(pairs & state.keys)
+        elif "di.status IN ('scheduled', 'snoozed')" in sql:
+            self.rows = [(i,) for i, status in state.status.items() if status in ("scheduled", "snoozed")]
+        elif "FOR UPDATE" in sql:
+            self.rows = [(i, USER_ID, 3, date(2025, 3, 3), state.status[i])
+                         for i in params if i in state.status]
+        elif sql.startswith("UPDATE dose_instances SET status"):
+            status, *instance_ids = params
+            pending.append(("status", {i: status for i in instance_ids}))
+        elif "INSERT INTO dose_events" in sql:
+            pending.append(("events", [params[i:i + 4] for i in range(0, len(params), 4)]))
+        elif "INSERT INTO device_messages" in sql:
+            pending.append(("keys", set(zip(params[::2], params[1::2]))))
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def close(self):
+        pass
+
+
+class FakeRaw:
+    def __init__(self, state):
+        self.db = state
+        self.pending = []
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def start_transaction(self):
+        self.pending = []
+
+    def commit(self):
+        if self.db.fail_commit:
+            raise RuntimeError("commit failed")
+        for kind, value in self.pending:
+            if kind == "status":
+                self.db.status.update(value)
+            elif kind == "events":
+                self.db.events.extend(value)
+            else:
+                self.db.keys |= value
+        self.db.commits += 1
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+
+class FakePool:
+    def __init__(self, state):
+        self.db = state
+
+    def acquire(self):
+        conn = db.PooledConnection(self, FakeRaw(self.db))
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        conn._checked_out = False
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    state = FakeDatabase()
+    monkeypatch.setattr(db, "get_pool", lambda: FakePool(state))
+    monkeypatch.setattr(ingest.pairing_resolver, "user_for_device",
+                        lambda device_id: USER_ID if device_id == DEVICE_ID else None)
+    monkeypatch.setattr(ingest.pairing_resolver, "devices_for_user", lambda user_id: [DEVICE_ID])
+    monkeypatch.setattr(ingest.device_hub, "set_alert", lambda device_id, active: None)
+    return state
+
+
+@pytest.fixture
+def worker():
+    # Flushed by hand; the writer thread's interval never comes up
+    return IngestWorker(batch_size=100, flush_interval=3600)
+
+
+def send(worker, acks, seq, event="pill_taken"):
+    payload = json.dumps({"device_id": DEVICE_ID, "event": event, "seq": seq,
+                          "timestamp": "2025-03-03T08:01:00Z"})
+    worker.submit(f"pillpal/device/{DEVICE_ID}/events", payload, lambda: acks.append(seq))
+
+
+def test_acked_only_after_commit(fake_db, worker):
+    acks = []
+    send(worker, acks, 1)
+    assert acks == []  # queued, not yet written
+
+    assert worker.buffer.flush()
+    assert acks == [1]
+    assert fake_db.commits == 1
+    assert fake_db.status[INSTANCE_ID] == "taken"
+    [(instance_id, event_type, source, meta)] = fake_db.events
+    assert (instance_id, event_type, source) == (INSTANCE_ID, "ack_taken", "device")
+    assert json.loads(meta)["key"] == "seq:1"
+
+
+def test_redelivered_seq_is_skipped(fake_db, worker):
+    acks = []
+    send(worker, acks, 1, event="snooze")
+    worker.buffer.flush()
+
+    send(worker, acks, 1, event="snooze")  # broker redelivery
+    send(worker, acks, 2, event="pill_taken")
+    worker.buffer.flush()
+
+    assert acks == [1, 1, 2]
+    assert [row[1] for row in fake_db.events] == ["snooze", "ack_taken"]
+    assert worker.stats()["duplicates"] == 1
+
+
+def test_failing_batch_is_not_acked(fake_db, worker):
+    acks = []
+    fake_db.fail_commit = True
+    send(worker, acks, 1)
+
+    assert not worker.buffer.flush()
+    assert acks == []
+    assert fake_db.status[INSTANCE_ID] == "scheduled"
+    assert worker.buffer.stats()["depth"] == 1
+
+    fake_db.fail_commit = False
+    assert worker.buffer.flush()
+    assert acks == [1]